@@ -0,0 +1,325 @@
+import json
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, Optional
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from app.config import settings
+from app.models import DirectoryData, StateData
+from app.revisions import record_revision
+from app.storage import Storage
+
+# 归档格式：gzip 压缩的 NDJSON，每行一条记录
+# 第一行为 {"type": "meta", ...}，其后为 directory / state 记录（缩略图随 state 记录一起导出）
+ARCHIVE_VERSION = 1
+ARCHIVE_MEDIA_TYPE = "application/gzip"
+
+# gzip 格式（wbits=16+MAX_WBITS）
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+# 压缩输出累积到该大小后再向外吐出，避免产生过多小块
+_FLUSH_SIZE = 64 * 1024
+# 单行记录的最大长度，防止恶意归档撑爆内存
+_MAX_LINE_SIZE = 16 * 1024 * 1024
+# 导入过程中数据先写在临时用户名下（~import:<开始时间戳>:<随机串>:<用户名>），
+# 用户名只允许字母、数字和下划线，不会与真实用户冲突
+_STAGING_PREFIX = "~import:"
+# 超过该时长仍未完成的导入视为进程已中断，其临时数据可以清理
+STAGING_MAX_AGE_SECONDS = 24 * 3600
+
+
+def archive_filename(username: str) -> str:
+    """导出归档的文件名"""
+    return f"{username}-fretboard.ndjson.gz"
+
+
+def _directory_record(dir_doc: dict) -> dict:
+    return {
+        "type": "directory",
+        "id": dir_doc["directory_id"],
+        "name": dir_doc["name"],
+        "createdAt": int(dir_doc["created_at"].timestamp() * 1000),
+        "isDefault": dir_doc["is_default"]
+    }
+
+
+def _state_record(state_doc: dict) -> dict:
+    return {
+        "type": "state",
+        "id": state_doc["state_id"],
+        "directoryId": state_doc["directory_id"],
+        "timestamp": state_doc["timestamp"],
+        "name": state_doc["name"],
+        "thumbnail": state_doc.get("thumbnail"),
+        "state": state_doc["state"]
+    }
+
+
+def iter_export(storage: Storage, username: str) -> Iterator[bytes]:
+    """
+    以流的方式导出用户的全部数据
+    直接从存储游标逐条读取并压缩，内存占用与账户大小无关
+    """
+    compressor = zlib.compressobj(wbits=_GZIP_WBITS)
+    buffer = bytearray()
+
+    def records():
+        yield {
+            "type": "meta",
+            "version": ARCHIVE_VERSION,
+            "username": username,
+            "exported_at": datetime.utcnow().isoformat()
+        }
+        for dir_doc in storage.iter_directories(username):
+            yield _directory_record(dir_doc)
+        # 目录在前、状态在后，导入时可以边读边校验状态所属目录
+        for state_doc in storage.iter_states(username):
+            yield _state_record(state_doc)
+
+    for record in records():
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        buffer += compressor.compress(line.encode("utf-8"))
+        if len(buffer) >= _FLUSH_SIZE:
+            yield bytes(buffer)
+            buffer.clear()
+
+    buffer += compressor.flush()
+    yield bytes(buffer)
+
+
+class ArchiveImporter:
+    """
+    增量导入归档
+    通过 feed() 逐块喂入压缩数据，记录按批次写入数据库，内存占用保持恒定
+    数据先写在临时用户名下，close() 校验通过后才替换用户的旧数据；
+    任何一步失败都会丢弃已写入的临时数据，旧数据保持不变
+    """
+
+    def __init__(self, storage: Storage, username: str, batch_size: Optional[int] = None):
+        self.storage = storage
+        self.username = username
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.directory_count = 0
+        self.state_count = 0
+        self._decompressor = zlib.decompressobj(wbits=_GZIP_WBITS)
+        self._pending = b""
+        self._seen_meta = False
+        self._directory_ids = set()
+        self._state_ids = set()
+        self._states_per_directory = {}
+        self._directory_batch = []
+        self._state_batch = []
+        self._staging = f"{_STAGING_PREFIX}{int(time.time())}:{uuid.uuid4().hex}:{username}"
+        self._discarded = False
+
+    def feed(self, chunk: bytes):
+        """喂入一块压缩数据"""
+        if not chunk:
+            return
+        with self._discard_on_error():
+            try:
+                data = self._decompressor.decompress(chunk)
+            except zlib.error:
+                raise HTTPException(status_code=400, detail="归档格式错误：无法解压")
+            self._consume(data)
+
+    def close(self) -> tuple[int, int]:
+        """
+        结束导入，写入剩余批次
+        返回: (目录数量, 状态数量)
+        """
+        with self._discard_on_error():
+            try:
+                data = self._decompressor.flush()
+            except zlib.error:
+                raise HTTPException(status_code=400, detail="归档格式错误：无法解压")
+            if not self._decompressor.eof:
+                raise HTTPException(status_code=400, detail="归档不完整")
+            self._consume(data)
+            if self._pending.strip():
+                self._handle_line(self._pending)
+            self._pending = b""
+            if not self._seen_meta:
+                raise HTTPException(status_code=400, detail="归档为空")
+            self._flush_directories()
+            self._flush_states()
+            removed_ids = self._record_revisions()
+
+        # 归档完整有效，用临时数据替换旧数据（只有头部的归档表示空账户，同样清空旧数据）
+        self.storage.delete_directories(self.username)
+        self.storage.delete_states(self.username)
+        # 只清理已不存在的状态的版本历史，误导入旧归档后仍可从历史中恢复
+        if removed_ids:
+            self.storage.delete_revisions(self.username, removed_ids)
+        self.storage.reassign_owner(self._staging, self.username)
+        self._discarded = True
+        return self.directory_count, self.state_count
+
+    def _record_revisions(self) -> list:
+        """
+        与 /data/save 一致：内容发生变化的状态记录新版本
+        返回: 导入后不再存在的状态 ID
+        """
+        previous_states = {doc["state_id"]: doc for doc in self.storage.iter_states(self.username)}
+        revisions = []
+        for state_doc in self.storage.iter_states(self._staging):
+            state_id = state_doc["state_id"]
+            revisions.append((state_id, record_revision(
+                self.storage, self.username, state_id, previous_states.get(state_id), state_doc
+            )))
+        for state_id, revision in revisions:
+            self.storage.update_state(self._staging, state_id, {"revision": revision})
+        imported_ids = {state_id for state_id, _ in revisions}
+        return [state_id for state_id in previous_states if state_id not in imported_ids]
+
+    def discard(self):
+        """丢弃已写入的临时数据（可重复调用），导入中途放弃时调用"""
+        if self._discarded:
+            return
+        self._discarded = True
+        self.storage.delete_states(self._staging)
+        self.storage.delete_directories(self._staging)
+
+    @contextmanager
+    def _discard_on_error(self):
+        try:
+            yield
+        except BaseException:
+            self.discard()
+            raise
+
+    def _consume(self, data: bytes):
+        self._pending += data
+        *lines, self._pending = self._pending.split(b"\n")
+        if len(self._pending) > _MAX_LINE_SIZE:
+            raise HTTPException(status_code=400, detail="归档记录过大")
+        for line in lines:
+            if line.strip():
+                self._handle_line(line)
+
+    def _handle_line(self, line: bytes):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="归档格式错误：无效的 JSON 记录")
+        if not isinstance(record, dict):
+            raise HTTPException(status_code=400, detail="归档格式错误：无效的记录")
+
+        record_type = record.pop("type", None)
+        if not self._seen_meta:
+            if record_type != "meta":
+                raise HTTPException(status_code=400, detail="归档格式错误：缺少头部信息")
+            if record.get("version") != ARCHIVE_VERSION:
+                raise HTTPException(status_code=400, detail="不支持的归档版本")
+            self._seen_meta = True
+            return
+
+        try:
+            if record_type == "directory":
+                self._add_directory(DirectoryData(**record))
+            elif record_type == "state":
+                self._add_state(StateData(**record))
+            else:
+                raise HTTPException(status_code=400, detail=f"归档格式错误：未知的记录类型 {record_type}")
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"归档记录无效: {str(e)}")
+
+    def _add_directory(self, dir_data: DirectoryData):
+        if dir_data.id in self._directory_ids:
+            raise HTTPException(status_code=400, detail=f"目录 {dir_data.id} 重复")
+        if len(self._directory_ids) >= 50:
+            raise HTTPException(status_code=400, detail="目录数量不能超过 50 个")
+        self._directory_ids.add(dir_data.id)
+        self._directory_batch.append({
+            "username": self._staging,
+            "directory_id": dir_data.id,
+            "name": dir_data.name,
+            "is_default": dir_data.isDefault,
+            "created_at": datetime.fromtimestamp(dir_data.createdAt / 1000)
+        })
+        if len(self._directory_batch) >= self.batch_size:
+            self._flush_directories()
+
+    def _add_state(self, state_data: StateData):
+        dir_id = state_data.directoryId
+        if state_data.id in self._state_ids:
+            raise HTTPException(status_code=400, detail=f"状态 {state_data.id} 重复")
+        if dir_id not in self._directory_ids:
+            raise HTTPException(status_code=400, detail=f"状态 {state_data.id} 所属目录 {dir_id} 不存在")
+        count = self._states_per_directory.get(dir_id, 0)
+        if count >= 50:
+            raise HTTPException(status_code=400, detail=f"目录 {dir_id} 的状态数量不能超过 50 条")
+        self._state_ids.add(state_data.id)
+        self._states_per_directory[dir_id] = count + 1
+        self._state_batch.append({
+            "username": self._staging,
+            "directory_id": dir_id,
+            "state_id": state_data.id,
+            "name": state_data.name,
+            "timestamp": state_data.timestamp,
+            "thumbnail": state_data.thumbnail,
+            "state": state_data.state,
+            "created_at": datetime.fromtimestamp(state_data.timestamp / 1000)
+        })
+        if len(self._state_batch) >= self.batch_size:
+            self._flush_states()
+
+    def _flush_directories(self):
+        if self._directory_batch:
+            self.storage.insert_directories(self._directory_batch)
+            self.directory_count += len(self._directory_batch)
+            self._directory_batch = []
+
+    def _flush_states(self):
+        # 状态引用目录，先确保目录已写入
+        self._flush_directories()
+        if self._state_batch:
+            self.storage.insert_states(self._state_batch)
+            self.state_count += len(self._state_batch)
+            self._state_batch = []
+
+
+def discard_stale_imports(storage: Storage, max_age_seconds: float = STAGING_MAX_AGE_SECONDS) -> int:
+    """
+    清理中断的导入遗留的临时数据（导入进程在 close/discard 之前退出时产生）
+    返回: 清理的临时用户名数量
+    """
+    deadline = time.time() - max_age_seconds
+    count = 0
+    for owner in storage.list_owners(_STAGING_PREFIX):
+        try:
+            started = int(owner[len(_STAGING_PREFIX):].split(":", 1)[0])
+        except ValueError:
+            started = 0
+        if started < deadline:
+            storage.delete_states(owner)
+            storage.delete_directories(owner)
+            count += 1
+    return count
+
+
+def import_file(storage: Storage, username: str, path: str, chunk_size: int = 64 * 1024) -> tuple[int, int]:
+    """从本地归档文件导入用户数据"""
+    importer = ArchiveImporter(storage, username)
+    try:
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                importer.feed(chunk)
+        return importer.close()
+    except BaseException:
+        importer.discard()
+        raise
+
+
+def export_file(storage: Storage, username: str, path: str):
+    """将用户数据导出到本地归档文件"""
+    with open(path, "wb") as f:
+        for chunk in iter_export(storage, username):
+            f.write(chunk)
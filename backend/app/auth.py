@@ -1,60 +1,129 @@
-from fastapi import Header, HTTPException
+from fastapi import Header, HTTPException, Query
 from typing import Optional
 import uuid
-from datetime import datetime
-from app.database import get_database
+from datetime import datetime, timedelta
+from app.config import settings
+from app.storage import get_storage
+from app.profiling import set_user
+from app.maintenance import discard_account_archive, restore_account, touch_account
 
 def generate_token() -> str:
     """生成唯一的 Token"""
     return str(uuid.uuid4())
 
+def _session_expiry(now: datetime) -> datetime:
+    return now + timedelta(hours=settings.SESSION_TTL_HOURS)
+
+def create_session(username: str) -> str:
+    """
+    为用户创建新的登录会话
+    同一用户可同时持有多个会话，超出上限时淘汰最久未使用的会话
+    """
+    storage = get_storage()
+    now = datetime.utcnow()
+    token = generate_token()
+    storage.insert_session({
+        "token": token,
+        "username": username,
+        "created_at": now,
+        "last_used": now,
+        "expires_at": _session_expiry(now)
+    })
+    storage.trim_sessions(username, settings.SESSION_MAX_PER_USER)
+    return token
+
 def create_or_login_user(username: str) -> tuple[str, bool]:
     """
     创建或登录用户
     返回: (token, is_new_user)
     """
-    db = get_database()
+    storage = get_storage()
     
     # 查找用户
-    user = db.users.find_one({"username": username})
+    user = storage.find_user(username)
     
-    if user:
-        # 用户已存在，更新最后登录时间
-        token = generate_token()
-        db.users.update_one(
-            {"username": username},
-            {
-                "$set": {
-                    "token": token,
-                    "last_login": datetime.utcnow()
-                }
-            }
+    # 创建新用户前，检查用户总数
+    if not user and storage.count_users() >= 1000:
+        raise HTTPException(
+            status_code=403,
+            detail="用户数量超上限，请联系作者"
         )
-        return token, False
-    else:
-        # 创建新用户前，检查用户总数
-        user_count = db.users.count_documents({})
-        if user_count >= 1000:
-            raise HTTPException(
-                status_code=403,
-                detail="用户数量超上限，请联系作者"
-            )
-        
+    
+    now = datetime.utcnow()
+    if user:
+        # 用户已存在，更新最后登录时间；账户正在归档时拒绝登录，归档完成后再次登录即可恢复
+        if not touch_account(storage, username, {
+            "last_login": now,
+            "last_active": now
+        }):
+            raise HTTPException(status_code=503, detail="账户正在归档，请稍后重试")
+    
+    # 因长期未活跃被归档的账户，先恢复数据再写入用户；
+    # 恢复失败时登录失败且归档保留，之后的任意一次登录都会重试
+    try:
+        restored = restore_account(storage, username)
+    except Exception as e:
+        print(f"Failed to restore archived account {username}: {e}")
+        raise HTTPException(status_code=503, detail="账户数据恢复失败，请稍后重试")
+    
+    if not user:
         # 创建新用户
-        token = generate_token()
-        db.users.insert_one({
+        storage.insert_user({
             "username": username,
-            "token": token,
-            "created_at": datetime.utcnow(),
-            "last_login": datetime.utcnow()
+            "created_at": now,
+            "last_login": now,
+            "last_active": now
         })
-        return token, True
+    if restored:
+        discard_account_archive(username)
+    return create_session(username), not user and not restored
 
-def verify_token(authorization: Optional[str] = Header(None)) -> str:
+def _resolve_session(token: str) -> Optional[str]:
     """
-    验证 Token 并返回用户名
-    用作 FastAPI 依赖项
+    根据 Token 查找有效会话并返回用户名
+    会话在有效期内被使用时滑动续期，续期按 SESSION_RENEW_MINUTES 节流，避免每个请求都写库
     """
+    storage = get_storage()
+    now = datetime.utcnow()
+    session = storage.find_session(token)
+    
+    if session is None:
+        # 兼容旧版本写在用户文档上的 Token：首次使用时转换为会话
+        user = storage.find_user_by_token(token)
+        if not user:
+            return None
+        try:
+            storage.insert_session({
+                "token": token,
+                "username": user["username"],
+                "created_at": now,
+                "last_used": now,
+                "expires_at": _session_expiry(now)
+            })
+        except Exception:
+            # 并发请求已完成转换
+            pass
+        storage.clear_user_token(user["username"])
+        return user["username"]
+    
+    # TTL 索引的后台删除存在延迟，过期与否以 expires_at 为准
+    if session["expires_at"] <= now:
+        storage.delete_session(token)
+        return None
+    
+    if now - session["last_used"] >= timedelta(minutes=settings.SESSION_RENEW_MINUTES):
+        # 账户正在归档时会话随后会被删除，不再续期
+        if not touch_account(storage, session["username"], {"last_active": now}):
+            return None
+        storage.update_session(token, {
+            "last_used": now,
+            "expires_at": _session_expiry(now)
+        })
+    
+    return session["username"]
+
+def parse_bearer_token(authorization: Optional[str]) -> str:
+    """从 Authorization 头中解析 Bearer Token"""
     if not authorization:
         raise HTTPException(status_code=401, detail="Unauthorized")
     
@@ -63,13 +132,36 @@ def verify_token(authorization: Optional[str] = Header(None)) -> str:
     if len(parts) != 2 or parts[0].lower() != "bearer":
         raise HTTPException(status_code=401, detail="Invalid authorization header")
     
-    token = parts[1]
-    
-    # 验证 Token
-    db = get_database()
-    user = db.users.find_one({"token": token})
+    return parts[1]
+
+def _authenticate(token: str) -> str:
+    username = _resolve_session(token)
     
-    if not user:
+    if not username:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    return user["username"]
+    set_user(username)
+    return username
+
+def verify_token(authorization: Optional[str] = Header(None)) -> str:
+    """
+    验证 Token 并返回用户名
+    用作 FastAPI 依赖项
+    """
+    return _authenticate(parse_bearer_token(authorization))
+
+def verify_event_token(
+    authorization: Optional[str] = Header(None),
+    token: Optional[str] = Query(None)
+) -> str:
+    """
+    实时推送连接的 Token 验证
+    浏览器原生 EventSource 无法设置请求头，允许通过查询参数 token 传递
+    """
+    if authorization or not token:
+        token = parse_bearer_token(authorization)
+    return _authenticate(token)
+
+def revoke_token(authorization: Optional[str] = Header(None)):
+    """注销当前会话，同一用户的其他会话不受影响"""
+    get_storage().delete_session(parse_bearer_token(authorization))
@@ -0,0 +1,161 @@
+"""
+存储后端延迟对比工具
+在各后端上统计热点接口的延迟和数据库操作次数；各后端的行为一致性由 tests/ 中的测试保证
+
+用法:
+    python -m app.bench                                 # 只测 SQLite
+    python -m app.bench --backend sqlite --backend mongo --rounds 500
+    python -m app.bench --backend mongo --backend mongo-embedded --directories 50 --states 50
+"""
+import argparse
+import asyncio
+import os
+import inspect
+import statistics
+import sys
+import tempfile
+import time
+
+import app.storage as storage_module
+from app.auth import create_or_login_user, verify_token
+from app.config import settings
+from app.models import SaveDataRequest, UpdateStateRequest
+from app.routers import data
+from app.profiling import trace_operations
+
+_BASE_TIME = 1700000000000
+
+
+def _make_state(i: int) -> dict:
+    return {
+        "data": {f"note-{n}": {"color": "red", "visible": n % 2 == 0} for n in range(40)},
+        "startFret": 0,
+        "endFret": 15 + i % 3,
+        "enharmonic": 1,
+        "displayMode": "note",
+        "rootNote": None,
+        "visibility": "all",
+    }
+
+
+def _open_backend(name: str, workdir: str):
+    if name == "sqlite":
+        from app.storage.sqlite import SqliteStorage
+        return SqliteStorage(os.path.join(workdir, f"bench-{name}.db"))
+    if name in ("mongo", "mongo-embedded"):
+        from pymongo import MongoClient
+        from app.database import ensure_indexes
+        from app.profiling import MongoCommandListener
+        from app.storage.mongo import MongoStorage
+        from app.storage.mongo_embedded import MongoEmbeddedStorage, ensure_embedded_indexes
+        client = MongoClient(settings.MONGODB_URL, event_listeners=[MongoCommandListener()])
+        db_name = f"{settings.DATABASE_NAME}_bench"
+        client.drop_database(db_name)
+        db = client[db_name]
+        ensure_indexes(db)
+        if name == "mongo-embedded":
+            ensure_embedded_indexes(db)
+            backend = MongoEmbeddedStorage(db)
+        else:
+            backend = MongoStorage(db)
+        backend.close = lambda: (client.drop_database(db_name), client.close())
+        return backend
+    raise ValueError(f"未知的存储后端: {name}")
+
+
+async def _seed(username: str, directories: int, states_per_directory: int) -> str:
+    token, _ = create_or_login_user(username)
+    request = SaveDataRequest(
+        directories=[
+            {"id": f"dir-{d}", "name": f"目录 {d}", "createdAt": _BASE_TIME, "isDefault": d == 0}
+            for d in range(directories)
+        ],
+        states=[
+            {
+                "id": f"state-{d}-{s}", "directoryId": f"dir-{d}", "timestamp": _BASE_TIME + s,
+                "name": f"状态 {s}", "thumbnail": "data:image/png;base64," + "A" * 2000,
+                "state": _make_state(s)
+            }
+            for d in range(directories) for s in range(states_per_directory)
+        ]
+    )
+    await data.save_data(request, username, None)
+    return token
+
+
+async def _measure(rounds: int, func) -> tuple[list, float]:
+    """
+    返回每次调用的耗时（毫秒）以及平均每次调用的数据库操作数
+    func 返回协程时在当前事件循环中等待，计时只包含调用本身
+    """
+    timings = []
+    operations = 0
+    for i in range(rounds):
+        with trace_operations() as trace:
+            start = time.perf_counter()
+            result = func(i)
+            if inspect.isawaitable(result):
+                await result
+            timings.append((time.perf_counter() - start) * 1000)
+        operations += len(trace.operations)
+    return timings, operations / rounds
+
+
+async def _latency(rounds: int, directories: int, states_per_directory: int) -> dict:
+    username = "bench_user"
+    token = await _seed(username, directories, states_per_directory)
+
+    def update(i):
+        state = _make_state(i)
+        state["data"][f"note-{i % 40}"]["color"] = f"c{i}"
+        return data.update_state("state-0-0", UpdateStateRequest(state=state), username, None)
+
+    return {
+        "verify_token": await _measure(rounds, lambda i: verify_token(f"Bearer {token}")),
+        "GET /data/load": await _measure(rounds, lambda i: data.load_data(username)),
+        "GET /data/states?directoryId": await _measure(
+            rounds, lambda i: data.get_states(f"dir-{i % directories}", username)
+        ),
+        "PUT /data/states/{id}": await _measure(rounds, update),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.bench", description="存储后端延迟对比")
+    parser.add_argument(
+        "--backend", action="append", choices=["sqlite", "mongo", "mongo-embedded"],
+        help="参与对比的后端（可重复），默认 sqlite"
+    )
+    parser.add_argument("--rounds", type=int, default=200, help="每个接口的调用次数")
+    parser.add_argument("--directories", type=int, default=10, help="压测账户的目录数量")
+    parser.add_argument("--states", type=int, default=20, help="压测账户每个目录的状态数量")
+    args = parser.parse_args(argv)
+
+    backends = args.backend or ["sqlite"]
+    results = {}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in backends:
+            backend = _open_backend(name, workdir)
+            storage_module.storage = backend
+            try:
+                # 每个后端的全部调用在同一个事件循环中执行，避免把创建事件循环的开销计入延迟
+                results[name] = asyncio.run(_latency(args.rounds, args.directories, args.states))
+            finally:
+                storage_module.storage = None
+                backend.close()
+
+    print(f"{'接口':<30}" + "".join(f"{name + ' p50/p95 ms, ops':>36}" for name in results))
+    for endpoint in next(iter(results.values())):
+        row = f"{endpoint:<30}"
+        for name in results:
+            timings, operations = results[name][endpoint]
+            timings = sorted(timings)
+            p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+            row += f"{statistics.median(timings):>18.3f} / {p95:<8.3f}{operations:>8.1f}"
+        print(row)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
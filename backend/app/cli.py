@@ -0,0 +1,152 @@
+"""
+管理员命令行工具
+
+用法:
+    python -m app.cli export --out backups/ [--user alice --user bob]
+    python -m app.cli import --in backups/ [--user alice]
+    python -m app.cli migrate-layout --to embedded|flat
+    python -m app.cli sweep
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+
+from fastapi import HTTPException
+
+from app.archive import archive_filename, export_file, import_file
+from app.config import settings
+from app.maintenance import sweep
+from app.storage import init_storage, close_storage, get_storage
+
+_ARCHIVE_SUFFIX = archive_filename("")
+
+
+def _export(args) -> int:
+    storage = get_storage()
+    os.makedirs(args.out, exist_ok=True)
+
+    if args.user:
+        usernames = args.user
+    else:
+        usernames = storage.list_usernames()
+
+    failed = 0
+    for username in usernames:
+        if not storage.find_user(username):
+            print(f"✗ {username}: 用户不存在", file=sys.stderr)
+            failed += 1
+            continue
+        path = os.path.join(args.out, archive_filename(username))
+        try:
+            export_file(storage, username, path)
+            print(f"✓ {username} -> {path}")
+        except Exception as e:
+            print(f"✗ {username}: {e}", file=sys.stderr)
+            failed += 1
+
+    print(f"导出完成: {len(usernames) - failed} 成功, {failed} 失败")
+    return 1 if failed else 0
+
+
+def _import(args) -> int:
+    storage = get_storage()
+
+    if args.user:
+        usernames = args.user
+    else:
+        usernames = sorted(
+            name[:-len(_ARCHIVE_SUFFIX)]
+            for name in os.listdir(args.input)
+            if name.endswith(_ARCHIVE_SUFFIX)
+        )
+
+    failed = 0
+    for username in usernames:
+        path = os.path.join(args.input, archive_filename(username))
+        try:
+            # 目标库中不存在的用户直接写入用户文档（不创建会话，也不受用户数量上限限制）
+            if not storage.find_user(username):
+                now = datetime.utcnow()
+                storage.insert_user({
+                    "username": username,
+                    "created_at": now,
+                    "last_login": now,
+                    "last_active": now
+                })
+            directory_count, state_count = import_file(storage, username, path)
+            print(f"✓ {username}: {directory_count} 个目录, {state_count} 个状态")
+        except HTTPException as e:
+            print(f"✗ {username}: {e.detail}", file=sys.stderr)
+            failed += 1
+        except Exception as e:
+            print(f"✗ {username}: {e}", file=sys.stderr)
+            failed += 1
+
+    print(f"导入完成: {len(usernames) - failed} 成功, {failed} 失败")
+    return 1 if failed else 0
+
+
+def _migrate_layout(args) -> int:
+    from app.database import get_database
+    from app.storage.mongo_embedded import migrate_to_embedded, migrate_to_flat
+
+    if settings.STORAGE_BACKEND != "mongo":
+        print("只有 Mongo 存储后端支持切换文档布局", file=sys.stderr)
+        return 1
+
+    db = get_database()
+    if args.to == "embedded":
+        directory_count, state_count = migrate_to_embedded(db)
+        orphans = db.states.count_documents({})
+        if orphans:
+            print(f"⚠ {orphans} 个状态没有所属目录，仍保留在 states 集合中", file=sys.stderr)
+    else:
+        directory_count, state_count = migrate_to_flat(db)
+
+    print(f"迁移完成: {directory_count} 个目录, {state_count} 个状态")
+    print(f"请设置 MONGO_LAYOUT={args.to} 后重启服务")
+    return 0
+
+
+def _sweep(args) -> int:
+    result = sweep(get_storage())
+    print(
+        f"清理完成: {result['expired_sessions']} 个过期会话, "
+        f"{result['stale_imports']} 个中断的导入, {result['archived_accounts']} 个账户已归档"
+    )
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Fretboard Diagram 管理工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="批量导出用户数据")
+    export_parser.add_argument("--out", required=True, help="归档输出目录")
+    export_parser.add_argument("--user", action="append", help="只导出指定用户（可重复），默认导出全部用户")
+    export_parser.set_defaults(func=_export)
+
+    import_parser = subparsers.add_parser("import", help="批量导入用户数据（全量替换）")
+    import_parser.add_argument("--in", dest="input", required=True, help="归档所在目录")
+    import_parser.add_argument("--user", action="append", help="只导入指定用户（可重复），默认导入目录下全部归档")
+    import_parser.set_defaults(func=_import)
+
+    migrate_parser = subparsers.add_parser("migrate-layout", help="在 flat 与 embedded 文档布局之间迁移 Mongo 数据")
+    migrate_parser.add_argument("--to", required=True, choices=["embedded", "flat"], help="目标布局")
+    migrate_parser.set_defaults(func=_migrate_layout)
+
+    sweep_parser = subparsers.add_parser("sweep", help="清理过期会话并归档未活跃账户（与后台任务相同）")
+    sweep_parser.set_defaults(func=_sweep)
+
+    args = parser.parse_args(argv)
+
+    init_storage()
+    try:
+        return args.func(args)
+    finally:
+        close_storage()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
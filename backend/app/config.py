@@ -6,6 +6,48 @@ class Settings:
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "fretboard_db")
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS", "*")
     API_PREFIX: str = os.getenv("API_PREFIX", "/api")
+    # 存储后端：mongo（默认）或 sqlite（嵌入式，单机部署和测试使用）
+    STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "mongo")
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "fretboard.db")
+    # Mongo 文档布局：flat（目录、状态分两个集合）或 embedded（状态内嵌在目录文档中）
+    # 切换前需先执行 python -m app.cli migrate-layout --to <layout>
+    MONGO_LAYOUT: str = os.getenv("MONGO_LAYOUT", "flat")
+    # 请求剖析：携带 X-Profile-Token 且与该值一致的请求会被剖析，为空时只按采样率触发
+    PROFILE_TOKEN: str = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    # 内存中保留的剖析结果数量；设置 PROFILE_DIR 时同时写出 .prof 文件
+    PROFILE_HISTORY: int = int(os.getenv("PROFILE_HISTORY", "20"))
+    PROFILE_DIR: Optional[str] = os.getenv("PROFILE_DIR") or None
+    # 慢请求阈值（毫秒），超过时记录结构化日志，0 表示关闭
+    SLOW_REQUEST_MS: float = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+    # 实时推送（SSE）：连接上限、每个连接的事件队列长度、心跳间隔
+    EVENT_MAX_CONNECTIONS: int = int(os.getenv("EVENT_MAX_CONNECTIONS", "500"))
+    EVENT_MAX_CONNECTIONS_PER_USER: int = int(os.getenv("EVENT_MAX_CONNECTIONS_PER_USER", "5"))
+    EVENT_QUEUE_SIZE: int = int(os.getenv("EVENT_QUEUE_SIZE", "100"))
+    EVENT_KEEPALIVE_SECONDS: float = float(os.getenv("EVENT_KEEPALIVE_SECONDS", "15"))
+    EVENT_RETRY_MS: int = int(os.getenv("EVENT_RETRY_MS", "3000"))
+    # 导入归档时每批写入的文档数量
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+    # 状态版本历史：每隔多少个版本存一次完整快照，其余版本存差异
+    REVISION_SNAPSHOT_INTERVAL: int = int(os.getenv("REVISION_SNAPSHOT_INTERVAL", "10"))
+    # 每个状态至少保留的版本数量，0 表示不清理
+    REVISION_RETENTION: int = int(os.getenv("REVISION_RETENTION", "50"))
+    # 登录会话：有效期（小时），使用中的会话每隔 SESSION_RENEW_MINUTES 分钟续期一次
+    SESSION_TTL_HOURS: float = float(os.getenv("SESSION_TTL_HOURS", "720"))
+    SESSION_RENEW_MINUTES: float = float(os.getenv("SESSION_RENEW_MINUTES", "60"))
+    # 每个用户同时保留的会话数量，超出时淘汰最久未使用的会话
+    SESSION_MAX_PER_USER: int = int(os.getenv("SESSION_MAX_PER_USER", "10"))
+    # 后台清理任务：执行间隔（秒），多 worker 部署时只需在一个 worker 中开启
+    SWEEPER_ENABLED: bool = os.getenv("SWEEPER_ENABLED", "true").lower() in ("1", "true", "yes")
+    SWEEPER_INTERVAL_SECONDS: float = float(os.getenv("SWEEPER_INTERVAL_SECONDS", "3600"))
+    # 超过该天数未活跃的账户导出到 ACCOUNT_ARCHIVE_DIR 后从库中移除，再次登录时自动恢复；0 表示关闭
+    INACTIVE_ACCOUNT_DAYS: int = int(os.getenv("INACTIVE_ACCOUNT_DAYS", "0"))
+    # 归档目录需位于持久化存储上（docker-compose 中挂载为 account_archive 卷）
+    ACCOUNT_ARCHIVE_DIR: str = os.getenv("ACCOUNT_ARCHIVE_DIR", "/data/account-archive")
+    # 每轮清理最多归档的账户数量
+    ACCOUNT_ARCHIVE_BATCH: int = int(os.getenv("ACCOUNT_ARCHIVE_BATCH", "50"))
+    # 归档中的账户暂不允许登录；归档流程中断时，标记超过该分钟数后失效
+    ACCOUNT_ARCHIVE_CLAIM_MINUTES: float = float(os.getenv("ACCOUNT_ARCHIVE_CLAIM_MINUTES", "60"))
     
     @property
     def cors_origins_list(self) -> list:
@@ -1,23 +1,41 @@
 from pymongo import MongoClient, ASCENDING
 from pymongo.database import Database
 from app.config import settings
+from app.profiling import MongoCommandListener
 
 client: MongoClient = None
 db: Database = None
 
 def connect_to_mongo():
     global client, db
-    client = MongoClient(settings.MONGODB_URL)
+    client = MongoClient(settings.MONGODB_URL, event_listeners=[MongoCommandListener()])
     db = client[settings.DATABASE_NAME]
+    ensure_indexes(db)
     
+    print(f"Connected to MongoDB: {settings.MONGODB_URL}")
+
+def ensure_indexes(db: Database):
     # 创建索引
     db.users.create_index([("username", ASCENDING)], unique=True)
-    db.users.create_index([("token", ASCENDING)], unique=True)
+    # 旧版本把 Token 写在用户文档上，现只在迁移前保留，改为稀疏索引
+    user_indexes = db.users.index_information()
+    if "token_1" in user_indexes and not user_indexes["token_1"].get("sparse"):
+        db.users.drop_index("token_1")
+    db.users.create_index([("token", ASCENDING)], unique=True, sparse=True)
+    db.users.create_index([("last_active", ASCENDING)])
+    db.sessions.create_index([("token", ASCENDING)], unique=True)
+    db.sessions.create_index([("username", ASCENDING), ("last_used", ASCENDING)])
+    # TTL 索引：会话在 expires_at 之后由 Mongo 自动删除
+    db.sessions.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
     db.directories.create_index([("username", ASCENDING)])
+    db.directories.create_index([("username", ASCENDING), ("directory_id", ASCENDING)])
     db.states.create_index([("username", ASCENDING)])
+    db.states.create_index([("username", ASCENDING), ("state_id", ASCENDING)])
     db.states.create_index([("username", ASCENDING), ("directory_id", ASCENDING)])
-    
-    print(f"Connected to MongoDB: {settings.MONGODB_URL}")
+    db.state_revisions.create_index(
+        [("username", ASCENDING), ("state_id", ASCENDING), ("rev", ASCENDING)],
+        unique=True
+    )
 
 def close_mongo_connection():
     global client
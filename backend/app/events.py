@@ -0,0 +1,227 @@
+import asyncio
+import itertools
+import json
+import threading
+from typing import AsyncIterator, Optional
+
+from fastapi import Header, HTTPException, Query
+
+from app.config import settings
+
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+
+# 积压过多时下发给客户端的事件，客户端收到后应重新执行 /data/load
+RESYNC_EVENT = {"type": "resync"}
+
+_CLOSED = object()
+
+# 客户端标识的最大长度
+_MAX_CLIENT_ID_LENGTH = 64
+
+
+def get_client_id(x_client_id: Optional[str] = Header(None)) -> Optional[str]:
+    """
+    读取请求头 X-Client-Id（每个浏览器标签页一个）
+    用作 FastAPI 依赖项：变更请求据此标记事件来源，实时连接据此跳过自己发起的变更
+    """
+    if not x_client_id:
+        return None
+    return x_client_id[:_MAX_CLIENT_ID_LENGTH]
+
+
+def get_event_client_id(
+    x_client_id: Optional[str] = Header(None),
+    client_id: Optional[str] = Query(None, alias="clientId")
+) -> Optional[str]:
+    """实时连接的客户端标识，原生 EventSource 无法设置请求头时通过查询参数 clientId 传递"""
+    return get_client_id(x_client_id or client_id)
+
+
+class Subscription:
+    """一个实时连接：事件队列有界，消费过慢时丢弃积压并通知客户端重新同步"""
+
+    def __init__(self, username: str, loop: asyncio.AbstractEventLoop, client_id: Optional[str] = None):
+        self.username = username
+        self.client_id = client_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.EVENT_QUEUE_SIZE)
+        self.dropped = 0
+
+    def _deliver(self, item):
+        if item is _CLOSED:
+            # 关闭信号必须送达
+            while self.queue.full():
+                self.queue.get_nowait()
+            self.queue.put_nowait(item)
+            return
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(RESYNC_EVENT)
+            return
+        self.queue.put_nowait(item)
+
+    def push(self, item):
+        """线程安全地投递事件"""
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, item)
+        except RuntimeError:
+            # 事件循环已关闭
+            pass
+
+
+class EventHub:
+    """进程内的事件分发：按用户维护实时连接，限制总连接数和单用户连接数"""
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+
+    @property
+    def connection_count(self) -> int:
+        return self._count
+
+    def subscribe(self, username: str, client_id: Optional[str] = None) -> Subscription:
+        with self._lock:
+            user_subscriptions = self._subscriptions.get(username, set())
+            if self._count >= settings.EVENT_MAX_CONNECTIONS:
+                raise HTTPException(status_code=503, detail="实时连接数已达上限")
+            if len(user_subscriptions) >= settings.EVENT_MAX_CONNECTIONS_PER_USER:
+                raise HTTPException(status_code=429, detail="当前用户的实时连接过多")
+            subscription = Subscription(username, asyncio.get_running_loop(), client_id)
+            user_subscriptions.add(subscription)
+            self._subscriptions[username] = user_subscriptions
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            user_subscriptions = self._subscriptions.get(subscription.username)
+            if user_subscriptions and subscription in user_subscriptions:
+                user_subscriptions.remove(subscription)
+                self._count -= 1
+                if not user_subscriptions:
+                    del self._subscriptions[subscription.username]
+
+    def dispatch(self, username: str, event: dict, origin: Optional[str] = None):
+        """把事件分发给该用户在本进程内的连接，跳过发起变更的客户端"""
+        with self._lock:
+            targets = [
+                s for s in self._subscriptions.get(username, ())
+                if origin is None or s.client_id != origin
+            ]
+        if not targets:
+            return
+        event = {**event, "seq": next(self._sequence)}
+        for subscription in targets:
+            subscription.push(event)
+
+    def close(self):
+        """关闭全部连接（服务停止时调用）"""
+        with self._lock:
+            targets = [s for subs in self._subscriptions.values() for s in subs]
+        for subscription in targets:
+            subscription.push(_CLOSED)
+
+
+class Broker:
+    """
+    事件代理接口
+    变更接口通过 publish 发布事件，代理负责把事件送到所有已挂接的 EventHub
+    多进程部署时可替换为基于外部消息服务的实现
+    """
+
+    def attach(self, hub: EventHub):
+        raise NotImplementedError
+
+    def detach(self, hub: EventHub):
+        raise NotImplementedError
+
+    def publish(self, username: str, event: dict, origin: Optional[str] = None):
+        """origin 为发起变更的客户端标识，该客户端的连接不会收到此事件"""
+        raise NotImplementedError
+
+
+class LocalBroker(Broker):
+    """
+    进程内代理：直接分发到挂接的 EventHub
+    挂接多个 EventHub 即可在单进程内模拟多个 worker
+    """
+
+    def __init__(self):
+        self._hubs = []
+
+    def attach(self, hub: EventHub):
+        if hub not in self._hubs:
+            self._hubs.append(hub)
+
+    def detach(self, hub: EventHub):
+        if hub in self._hubs:
+            self._hubs.remove(hub)
+
+    def publish(self, username: str, event: dict, origin: Optional[str] = None):
+        for hub in list(self._hubs):
+            hub.dispatch(username, event, origin)
+
+
+hub = EventHub()
+broker: Broker = LocalBroker()
+broker.attach(hub)
+
+
+def get_hub() -> EventHub:
+    return hub
+
+
+def get_broker() -> Broker:
+    return broker
+
+
+def set_broker(new_broker: Broker):
+    """替换事件代理，本进程的 EventHub 会改挂到新代理上"""
+    global broker
+    broker.detach(hub)
+    broker = new_broker
+    broker.attach(hub)
+
+
+def publish_event(username: str, event_type: str, origin: Optional[str] = None, **payload):
+    """
+    发布数据变更事件，只包含 ID 等元数据，客户端按需拉取完整内容
+    origin 为发起变更的客户端标识（X-Client-Id），事件只推送给该用户的其他客户端
+    """
+    try:
+        broker.publish(username, {"type": event_type, **payload}, origin)
+    except Exception as e:
+        # 推送失败不影响数据写入
+        print(f"Failed to publish event {event_type}: {e}")
+
+
+def _format_event(event: dict) -> str:
+    data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+    seq = event.get("seq")
+    prefix = f"id: {seq}\n" if seq else ""
+    return f"{prefix}event: {event['type']}\ndata: {data}\n\n"
+
+
+async def event_stream(subscription: Subscription, is_disconnected) -> AsyncIterator[str]:
+    """把订阅中的事件编码为 SSE 流，空闲时定期发送心跳"""
+    try:
+        yield f"retry: {settings.EVENT_RETRY_MS}\n\n"
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), timeout=settings.EVENT_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield ": keepalive\n\n"
+                continue
+            if item is _CLOSED:
+                return
+            yield _format_event(item)
+    finally:
+        hub.unsubscribe(subscription)
+
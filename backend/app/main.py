@@ -1,18 +1,29 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+import asyncio
 
 from app.config import settings
-from app.database import connect_to_mongo, close_mongo_connection
-from app.routers import auth, data
+from app.storage import init_storage, close_storage
+from app.events import get_hub
+from app.maintenance import run_sweeper
+from app.profiling import ProfilingMiddleware
+from app.routers import auth, data, debug
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时连接数据库
-    connect_to_mongo()
+    init_storage()
+    # 后台清理过期会话和未活跃账户
+    sweeper = asyncio.create_task(run_sweeper()) if settings.SWEEPER_ENABLED else None
     yield
-    # 关闭时断开连接
-    close_mongo_connection()
+    # 关闭时停止清理任务，断开实时连接和数据库连接
+    if sweeper:
+        sweeper.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweeper
+    get_hub().close()
+    close_storage()
 
 app = FastAPI(
     title="Fretboard Diagram API",
@@ -28,11 +39,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id"],
 )
 
+# 请求追踪与剖析
+app.add_middleware(ProfilingMiddleware)
+
 # 注册路由
 app.include_router(auth.router, prefix=settings.API_PREFIX)
 app.include_router(data.router, prefix=settings.API_PREFIX)
+app.include_router(debug.router, prefix=settings.API_PREFIX)
 
 @app.get("/")
 async def root():
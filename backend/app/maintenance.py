@@ -0,0 +1,120 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.archive import archive_filename, discard_stale_imports, export_file, import_file
+from app.config import settings
+from app.storage import Storage, get_storage
+
+
+def _account_archive_path(username: str) -> str:
+    return os.path.join(settings.ACCOUNT_ARCHIVE_DIR, archive_filename(username))
+
+
+def _stale_claim_before(now: datetime) -> datetime:
+    return now - timedelta(minutes=settings.ACCOUNT_ARCHIVE_CLAIM_MINUTES)
+
+
+def touch_account(storage: Storage, username: str, fields: dict) -> bool:
+    """
+    登录、会话续期时更新用户文档
+    账户正在归档时不更新并返回 False，调用方应拒绝本次请求，避免写入的数据随后被归档流程删除
+    """
+    return storage.touch_user(username, fields, _stale_claim_before(datetime.utcnow()))
+
+
+def archive_account(storage: Storage, username: str, cutoff: datetime, now: Optional[datetime] = None) -> bool:
+    """
+    把未活跃账户的数据导出到 ACCOUNT_ARCHIVE_DIR，然后从库中移除用户、会话和全部数据
+    归档不包含版本历史；先在用户文档上标记归档中，标记期间登录和会话续期都会被拒绝，
+    用户文档最后删除，删除完成前账户都保持标记状态
+    """
+    now = now or datetime.utcnow()
+    # Mongo 只保存到毫秒，标记时间按毫秒截断以便之后按值撤销
+    claimed_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    if not storage.claim_inactive_user(username, cutoff, claimed_at, _stale_claim_before(now)):
+        # 已重新活跃或正由其他清理任务归档
+        return False
+
+    path = _account_archive_path(username)
+    # 每次调用使用独立的临时文件，并发的清理任务不会互相覆盖
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.makedirs(settings.ACCOUNT_ARCHIVE_DIR, exist_ok=True)
+        export_file(storage, username, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        storage.release_user_claim(username, claimed_at)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    storage.delete_sessions(username)
+    storage.delete_revisions(username)
+    storage.delete_states(username)
+    storage.delete_directories(username)
+    storage.delete_user(username)
+    return True
+
+
+def restore_account(storage: Storage, username: str) -> bool:
+    """
+    恢复已归档账户的数据，返回是否存在归档
+    恢复失败时抛出异常，旧数据和归档文件都保持不变，下次登录时重试；
+    调用方需确认账户不在归档中，并在用户文档写入成功后再调用 discard_account_archive 删除归档
+    """
+    path = _account_archive_path(username)
+    if not os.path.exists(path):
+        return False
+    import_file(storage, username, path)
+    return True
+
+
+def discard_account_archive(username: str):
+    """删除已恢复账户的归档文件"""
+    try:
+        os.remove(_account_archive_path(username))
+    except FileNotFoundError:
+        pass
+
+
+def sweep(storage: Storage, now: Optional[datetime] = None) -> dict:
+    """
+    执行一轮清理：删除过期会话和中断导入遗留的临时数据，归档长期未活跃的账户
+    返回: {"expired_sessions": 数量, "stale_imports": 数量, "archived_accounts": 数量}
+    """
+    now = now or datetime.utcnow()
+    result = {
+        "expired_sessions": storage.delete_expired_sessions(now),
+        "stale_imports": discard_stale_imports(storage),
+        "archived_accounts": 0
+    }
+
+    if settings.INACTIVE_ACCOUNT_DAYS > 0:
+        cutoff = now - timedelta(days=settings.INACTIVE_ACCOUNT_DAYS)
+        for username in storage.find_inactive_users(cutoff, settings.ACCOUNT_ARCHIVE_BATCH):
+            try:
+                if archive_account(storage, username, cutoff, now):
+                    result["archived_accounts"] += 1
+            except Exception as e:
+                print(f"Failed to archive account {username}: {e}")
+
+    return result
+
+
+async def run_sweeper():
+    """后台清理任务，随服务启动，按 SWEEPER_INTERVAL_SECONDS 周期执行"""
+    while True:
+        try:
+            result = await run_in_threadpool(sweep, get_storage())
+            if any(result.values()):
+                print(f"Sweeper: {result['expired_sessions']} expired sessions, "
+                      f"{result['stale_imports']} stale imports, "
+                      f"{result['archived_accounts']} archived accounts")
+        except Exception as e:
+            print(f"Sweeper failed: {e}")
+        await asyncio.sleep(settings.SWEEPER_INTERVAL_SECONDS)
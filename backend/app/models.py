@@ -183,6 +183,16 @@ class StateResponse(BaseModel):
     class Config:
         populate_by_name = True
 
+class RevisionResponse(BaseModel):
+    revision: int
+    kind: str
+    name: str
+    timestamp: int
+    createdAt: int
+
+class StateRevisionResponse(StateResponse):
+    revision: int
+
 class SuccessResponse(BaseModel):
     success: bool
     message: str
@@ -0,0 +1,258 @@
+import cProfile
+import contextvars
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from fastapi import HTTPException
+from pymongo import monitoring
+
+from app.config import settings
+
+logger = logging.getLogger("app.slow")
+
+PROFILE_HEADER = "x-profile-token"
+PROFILE_ID_HEADER = "x-profile-id"
+
+# 单个请求最多记录的数据库操作条数，超出部分只计数
+_MAX_OPERATIONS = 200
+
+# 长连接接口（SSE）不做剖析：剖析期间会持有全局锁并拖慢事件循环上的所有请求
+_UNPROFILED_PATHS = {f"{settings.API_PREFIX}/data/events"}
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("request_trace", default=None)
+
+
+class RequestTrace:
+    """单个请求的追踪信息：用户、请求体大小以及期间发出的数据库操作"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route = path
+        self.username: Optional[str] = None
+        self.payload_bytes = 0
+        self.response_bytes = 0
+        self.status: Optional[int] = None
+        self.long_lived = False
+        self.operations = []
+        self.dropped_operations = 0
+        self.db_ms = 0.0
+        self.started = time.perf_counter()
+
+    def add_operation(self, name: str, duration_ms: float):
+        self.db_ms += duration_ms
+        if len(self.operations) < _MAX_OPERATIONS:
+            self.operations.append({"op": name, "ms": round(duration_ms, 3)})
+        else:
+            self.dropped_operations += 1
+
+    def to_dict(self, duration_ms: float) -> dict:
+        return {
+            "method": self.method,
+            "route": self.route,
+            "status": self.status,
+            "user": self.username,
+            "payload_bytes": self.payload_bytes,
+            "response_bytes": self.response_bytes,
+            "duration_ms": round(duration_ms, 3),
+            "db_ms": round(self.db_ms, 3),
+            "db_ops": self.operations,
+            "db_ops_dropped": self.dropped_operations,
+        }
+
+
+def record_operation(name: str, duration_ms: float):
+    """记录一次数据库操作，不在请求上下文中（如命令行工具）时忽略"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_operation(name, duration_ms)
+
+
+@contextmanager
+def trace_operations(method: str = "", path: str = "") -> Iterator[RequestTrace]:
+    """在请求之外（如压测工具）收集期间发出的数据库操作"""
+    trace = RequestTrace(method, path)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def set_user(username: str):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.username = username
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """把 Mongo 命令及耗时记录到当前请求的追踪信息中"""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        if _current_trace.get() is None:
+            return
+        target = event.command.get(event.command_name)
+        name = f"{event.command_name} {target}" if isinstance(target, str) else event.command_name
+        self._pending[(event.connection_id, event.request_id)] = name
+
+    def succeeded(self, event):
+        name = self._pending.pop((event.connection_id, event.request_id), None)
+        if name:
+            record_operation(name, event.duration_micros / 1000)
+
+    def failed(self, event):
+        name = self._pending.pop((event.connection_id, event.request_id), None)
+        if name:
+            record_operation(f"{name} (failed)", event.duration_micros / 1000)
+
+
+# ========== 调用剖析 ==========
+
+# cProfile 的钩子是按线程设置的，同一时间只剖析一个请求
+_profile_lock = threading.Lock()
+_profiles: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def _is_privileged(token: Optional[str]) -> bool:
+    return bool(settings.PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, settings.PROFILE_TOKEN)
+
+
+def verify_profile_token(token: Optional[str]):
+    """校验剖析接口的特权 Token"""
+    if not _is_privileged(token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def _should_profile(token: Optional[str]) -> bool:
+    if _is_privileged(token):
+        return True
+    return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+
+def _store_profile(profile_id: str, profiler: cProfile.Profile, trace: RequestTrace, duration_ms: float):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(60)
+
+    if settings.PROFILE_DIR:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        stats.dump_stats(os.path.join(settings.PROFILE_DIR, f"{profile_id}.prof"))
+
+    _profiles[profile_id] = {
+        "id": profile_id,
+        "created_at": time.time(),
+        "request": trace.to_dict(duration_ms),
+        "stats": stream.getvalue(),
+    }
+    while len(_profiles) > settings.PROFILE_HISTORY:
+        _profiles.popitem(last=False)
+
+
+def list_profiles() -> list:
+    return [
+        {"id": p["id"], "created_at": p["created_at"], "request": p["request"]}
+        for p in reversed(_profiles.values())
+    ]
+
+
+def get_profile(profile_id: str) -> Optional[dict]:
+    return _profiles.get(profile_id)
+
+
+# ========== 中间件 ==========
+
+class ProfilingMiddleware:
+    """
+    请求追踪中间件（ASGI）
+    - 统计请求体大小、数据库操作及耗时，超过 SLOW_REQUEST_MS 时写结构化慢请求日志
+    - 携带特权 Token 或命中采样率的请求会被 cProfile 剖析，结果 ID 通过 X-Profile-Id 响应头返回
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"])
+        token = None
+        for key, value in scope.get("headers", []):
+            if key == PROFILE_HEADER.encode("latin-1"):
+                token = value.decode("latin-1")
+                break
+
+        profiler = None
+        if (
+            scope["path"] not in _UNPROFILED_PATHS
+            and _should_profile(token)
+            and _profile_lock.acquire(blocking=False)
+        ):
+            profiler = cProfile.Profile()
+        profile_id = uuid.uuid4().hex if profiler else None
+
+        def cancel_profiling():
+            nonlocal profiler, profile_id
+            profiler.disable()
+            profiler = None
+            profile_id = None
+            _profile_lock.release()
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                trace.payload_bytes += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                for key, value in message.get("headers", []):
+                    if key.lower() == b"content-type" and value.startswith(b"text/event-stream"):
+                        # 实时推送连接本身就是长连接，不计入慢请求，也不继续剖析
+                        trace.long_lived = True
+                if trace.long_lived and profiler:
+                    cancel_profiling()
+                if profile_id:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (PROFILE_ID_HEADER.encode("latin-1"), profile_id.encode("latin-1"))
+                    ]
+            elif message["type"] == "http.response.body":
+                trace.response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        context_token = _current_trace.set(trace)
+        try:
+            if profiler:
+                profiler.enable()
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            if profiler:
+                profiler.disable()
+            _current_trace.reset(context_token)
+            duration_ms = (time.perf_counter() - trace.started) * 1000
+            route = scope.get("route")
+            if route is not None:
+                trace.route = route.path
+            if profiler:
+                try:
+                    _store_profile(profile_id, profiler, trace, duration_ms)
+                finally:
+                    _profile_lock.release()
+            if not trace.long_lived and 0 < settings.SLOW_REQUEST_MS <= duration_ms:
+                logger.warning(json.dumps({"event": "slow_request", **trace.to_dict(duration_ms)}, ensure_ascii=False))
@@ -0,0 +1,143 @@
+import copy
+from datetime import datetime
+from typing import Optional
+
+from app.config import settings
+from app.storage import Storage
+
+# 纳入版本历史的状态字段
+# 缩略图由前端根据 state 重新生成，且每次保存都会变化，不纳入历史，恢复时保留当前缩略图
+REVISION_FIELDS = ("directory_id", "name", "timestamp", "state")
+
+_MISSING = object()
+
+
+def snapshot(state_doc: dict) -> dict:
+    """提取状态文档中需要记录版本的字段"""
+    return {field: copy.deepcopy(state_doc.get(field)) for field in REVISION_FIELDS}
+
+
+def compute_delta(old: dict, new: dict, path: Optional[list] = None) -> list:
+    """
+    计算两个字典之间的差异
+    只对嵌套字典逐层比较，列表和标量发生变化时整体替换
+    返回操作列表: {"op": "set", "path": [...], "value": ...} 或 {"op": "unset", "path": [...]}
+    """
+    path = path or []
+    ops = []
+    for key, new_value in new.items():
+        old_value = old.get(key, _MISSING)
+        if old_value is _MISSING:
+            ops.append({"op": "set", "path": path + [key], "value": new_value})
+        elif isinstance(old_value, dict) and isinstance(new_value, dict):
+            ops.extend(compute_delta(old_value, new_value, path + [key]))
+        elif old_value != new_value or type(old_value) is not type(new_value):
+            ops.append({"op": "set", "path": path + [key], "value": new_value})
+    for key in old:
+        if key not in new:
+            ops.append({"op": "unset", "path": path + [key]})
+    return ops
+
+
+def apply_delta(base: dict, ops: list) -> dict:
+    """将差异应用到 base 上，返回新的字典（不修改 base）"""
+    result = copy.deepcopy(base)
+    for op in ops:
+        *parents, key = op["path"]
+        target = result
+        for part in parents:
+            target = target[part]
+        if op["op"] == "set":
+            target[key] = copy.deepcopy(op["value"])
+        else:
+            target.pop(key, None)
+    return result
+
+
+def _is_snapshot_revision(rev: int) -> bool:
+    # 每隔 REVISION_SNAPSHOT_INTERVAL 个版本存一次完整快照，其余存差异
+    return (rev - 1) % settings.REVISION_SNAPSHOT_INTERVAL == 0
+
+
+def _write_revision(storage: Storage, username: str, state_id: str, rev: int, content: dict, previous: Optional[dict]):
+    doc = {
+        "username": username,
+        "state_id": state_id,
+        "rev": rev,
+        "name": content["name"],
+        "timestamp": content["timestamp"],
+        "created_at": datetime.utcnow()
+    }
+    if previous is None or _is_snapshot_revision(rev):
+        doc["kind"] = "full"
+        doc["content"] = content
+    else:
+        doc["kind"] = "delta"
+        doc["delta"] = compute_delta(previous, content)
+    # 覆盖写入，上一次写入版本后状态更新失败时可以安全重试
+    storage.save_revision(doc)
+
+
+def _apply_retention(storage: Storage, username: str, state_id: str, rev: int):
+    """
+    按保留策略清理旧版本
+    只在快照边界整段删除，保证保留下来的最早版本始终是完整快照
+    """
+    retention = settings.REVISION_RETENTION
+    if retention <= 0:
+        return
+    oldest_wanted = rev - retention + 1
+    if oldest_wanted <= 1 or not _is_snapshot_revision(oldest_wanted):
+        return
+    storage.delete_revisions(username, [state_id], before_rev=oldest_wanted)
+
+
+def record_revision(storage: Storage, username: str, state_id: str, previous_doc: Optional[dict], new_doc: dict) -> int:
+    """
+    为状态的新内容记录一个版本
+    previous_doc 为更新前的状态文档（新建时为 None），返回新内容对应的版本号
+    """
+    current = snapshot(new_doc)
+    prev_rev = 0
+    previous = None
+
+    if previous_doc is not None:
+        previous = snapshot(previous_doc)
+        prev_rev = previous_doc.get("revision") or 0
+        if not prev_rev:
+            # 启用版本历史之前创建的状态，先把旧内容存为基准快照
+            storage.delete_revisions(username, [state_id])
+            prev_rev = 1
+            _write_revision(storage, username, state_id, prev_rev, previous, None)
+        if previous == current:
+            return prev_rev
+
+    rev = prev_rev + 1
+    _write_revision(storage, username, state_id, rev, current, previous)
+    _apply_retention(storage, username, state_id, rev)
+    return rev
+
+
+def load_revision(storage: Storage, username: str, state_id: str, rev: int) -> Optional[dict]:
+    """
+    重建指定版本的状态内容
+    从不晚于该版本的最近一个快照开始依次应用差异，最多读取 REVISION_SNAPSHOT_INTERVAL 个版本
+    """
+    base = storage.find_snapshot_revision(username, state_id, rev)
+    if not base:
+        return None
+
+    # 早期版本的快照和差异中可能带有缩略图，重建结果只保留版本字段
+    content = snapshot(base["content"])
+    current_rev = base["rev"]
+    if current_rev == rev:
+        return content
+
+    for delta_doc in storage.iter_delta_revisions(username, state_id, current_rev, rev):
+        if delta_doc["rev"] != current_rev + 1:
+            # 版本链断裂，无法可靠重建
+            return None
+        content = apply_delta(content, [op for op in delta_doc["delta"] if op["path"][0] in REVISION_FIELDS])
+        current_rev = delta_doc["rev"]
+
+    return content if current_rev == rev else None
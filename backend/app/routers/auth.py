@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from app.models import LoginRequest, LoginResponse, VerifyResponse
-from app.auth import create_or_login_user, verify_token
+from app.models import LoginRequest, LoginResponse, VerifyResponse, StandardResponse
+from app.auth import create_or_login_user, verify_token, revoke_token
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -16,6 +16,8 @@ async def login(request: LoginRequest):
             username=request.username,
             message=message
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -23,3 +25,8 @@ async def login(request: LoginRequest):
 async def verify(username: str = Depends(verify_token)):
     """验证 Token 接口"""
     return VerifyResponse(valid=True, username=username)
+
+@router.post("/logout", response_model=StandardResponse)
+async def logout(username: str = Depends(verify_token), _: None = Depends(revoke_token)):
+    """注销当前会话，同一用户在其他设备上的登录不受影响"""
+    return StandardResponse(success=True, message="已退出登录")
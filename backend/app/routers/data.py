@@ -1,26 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from datetime import datetime
 from typing import Optional, List
 from app.models import (
     SaveDataRequest, SaveDataResponse, LoadDataResponse,
     CreateDirectoryRequest, UpdateDirectoryRequest, DirectoryResponse,
     CreateStateRequest, UpdateStateRequest, StateResponse,
-    StandardResponse
+    RevisionResponse, StateRevisionResponse, StandardResponse
+)
+from app.auth import verify_event_token, verify_token
+from app.storage import get_storage
+from app.archive import ARCHIVE_MEDIA_TYPE, ArchiveImporter, archive_filename, iter_export
+from app.revisions import record_revision, load_revision
+from app.events import (
+    EVENT_STREAM_MEDIA_TYPE, event_stream, get_client_id, get_event_client_id, get_hub, publish_event
 )
-from app.auth import verify_token
-from app.database import get_database
 
 router = APIRouter(prefix="/data", tags=["data"])
 
 @router.post("/save", response_model=SaveDataResponse)
-async def save_data(request: SaveDataRequest, username: str = Depends(verify_token)):
+async def save_data(
+    request: SaveDataRequest,
+    username: str = Depends(verify_token),
+    client_id: Optional[str] = Depends(get_client_id)
+):
     """保存用户数据（全量替换）"""
     try:
-        db = get_database()
+        storage = get_storage()
+        
+        # 内嵌布局下状态必须属于本次保存的目录，在删除旧数据之前拒绝
+        if storage.name == "mongo-embedded":
+            dir_ids = {dir_data.id for dir_data in request.directories}
+            for state_data in request.states:
+                if state_data.directoryId not in dir_ids:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"状态 {state_data.id} 所属目录 {state_data.directoryId} 不存在"
+                    )
+        
+        # 记录旧状态，用于生成版本历史
+        previous_states = {
+            doc["state_id"]: doc for doc in storage.iter_states(username)
+        }
         
         # 删除用户现有数据
-        db.directories.delete_many({"username": username})
-        db.states.delete_many({"username": username})
+        storage.delete_directories(username)
+        storage.delete_states(username)
         
         # 插入目录数据
         if request.directories:
@@ -33,13 +59,13 @@ async def save_data(request: SaveDataRequest, username: str = Depends(verify_tok
                     "is_default": dir_data.isDefault,
                     "created_at": datetime.fromtimestamp(dir_data.createdAt / 1000)
                 })
-            db.directories.insert_many(directories_to_insert)
+            storage.insert_directories(directories_to_insert)
         
         # 插入状态数据
         if request.states:
             states_to_insert = []
             for state_data in request.states:
-                states_to_insert.append({
+                state_doc = {
                     "username": username,
                     "directory_id": state_data.directoryId,
                     "state_id": state_data.id,
@@ -48,8 +74,26 @@ async def save_data(request: SaveDataRequest, username: str = Depends(verify_tok
                     "thumbnail": state_data.thumbnail,
                     "state": state_data.state,
                     "created_at": datetime.fromtimestamp(state_data.timestamp / 1000)
-                })
-            db.states.insert_many(states_to_insert)
+                }
+                # 只有内容发生变化的状态才会产生新版本
+                state_doc["revision"] = record_revision(
+                    storage, username, state_data.id,
+                    previous_states.get(state_data.id), state_doc
+                )
+                states_to_insert.append(state_doc)
+            storage.insert_states(states_to_insert)
+        
+        # 清理已被移除的状态的版本历史
+        kept_ids = {state_data.id for state_data in request.states}
+        removed_ids = [state_id for state_id in previous_states if state_id not in kept_ids]
+        if removed_ids:
+            storage.delete_revisions(username, removed_ids)
+        
+        publish_event(
+            username, "data.replaced",
+            directories=len(request.directories), states=len(request.states),
+            origin=client_id
+        )
         
         saved_at = datetime.utcnow()
         return SaveDataResponse(
@@ -57,6 +101,8 @@ async def save_data(request: SaveDataRequest, username: str = Depends(verify_tok
             message=f"成功保存 {len(request.directories)} 个目录和 {len(request.states)} 个状态",
             saved_at=saved_at
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"保存失败: {str(e)}")
 
@@ -64,10 +110,10 @@ async def save_data(request: SaveDataRequest, username: str = Depends(verify_tok
 async def load_data(username: str = Depends(verify_token)):
     """加载用户数据（兼容接口）"""
     try:
-        db = get_database()
+        storage = get_storage()
         
         # 查询目录
-        directories_cursor = db.directories.find({"username": username})
+        directories_cursor = storage.iter_directories(username)
         directories = []
         for dir_doc in directories_cursor:
             directories.append({
@@ -78,7 +124,7 @@ async def load_data(username: str = Depends(verify_token)):
             })
         
         # 查询状态
-        states_cursor = db.states.find({"username": username})
+        states_cursor = storage.iter_states(username)
         states = []
         for state_doc in states_cursor:
             states.append({
@@ -98,33 +144,98 @@ async def load_data(username: str = Depends(verify_token)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"加载失败: {str(e)}")
 
+# ========== 全量导出 / 导入 ==========
+
+@router.get("/export")
+async def export_data(username: str = Depends(verify_token)):
+    """流式导出用户全部数据（gzip 压缩的 NDJSON 归档）"""
+    storage = get_storage()
+    return StreamingResponse(
+        iter_export(storage, username),
+        media_type=ARCHIVE_MEDIA_TYPE,
+        headers={
+            "Content-Disposition": f'attachment; filename="{archive_filename(username)}"'
+        }
+    )
+
+@router.post("/import", response_model=SaveDataResponse)
+async def import_data(
+    request: Request,
+    username: str = Depends(verify_token),
+    client_id: Optional[str] = Depends(get_client_id)
+):
+    """流式导入归档（全量替换），按批次写入数据库"""
+    try:
+        importer = ArchiveImporter(get_storage(), username)
+        try:
+            async for chunk in request.stream():
+                importer.feed(chunk)
+            directory_count, state_count = importer.close()
+        except BaseException:
+            # 客户端中途断开等情况下丢弃已写入的临时数据
+            importer.discard()
+            raise
+        publish_event(username, "data.replaced", directories=directory_count, states=state_count, origin=client_id)
+
+        return SaveDataResponse(
+            success=True,
+            message=f"成功导入 {directory_count} 个目录和 {state_count} 个状态",
+            saved_at=datetime.utcnow()
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"导入失败: {str(e)}")
+
+# ========== 实时推送 ==========
+
+@router.get("/events")
+async def data_events(
+    request: Request,
+    username: str = Depends(verify_event_token),
+    client_id: Optional[str] = Depends(get_event_client_id)
+):
+    """
+    实时推送当前用户的数据变更（Server-Sent Events）
+    事件只包含变更对象的 ID 等元数据；收到 resync 事件时客户端应重新加载全部数据
+    Token 和客户端标识可通过查询参数 token、clientId 传递，供原生 EventSource 使用
+    """
+    hub = get_hub()
+    subscription = hub.subscribe(username, client_id)
+    return StreamingResponse(
+        event_stream(subscription, request.is_disconnected),
+        media_type=EVENT_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # 连接在开始输出前断开时也要释放名额
+        background=BackgroundTask(hub.unsubscribe, subscription)
+    )
+
 # ========== 目录管理 RESTful 接口 ==========
 
 @router.post("/directories", response_model=DirectoryResponse, status_code=201)
 async def create_directory(
     request: CreateDirectoryRequest,
-    username: str = Depends(verify_token)
+    username: str = Depends(verify_token),
+    client_id: Optional[str] = Depends(get_client_id)
 ):
     """创建目录"""
     try:
-        db = get_database()
+        storage = get_storage()
         
         # 检查目录ID是否已存在
-        existing = db.directories.find_one({
-            "username": username,
-            "directory_id": request.id
-        })
+        existing = storage.find_directory(username, request.id)
         if existing:
             raise HTTPException(status_code=400, detail="目录ID已存在")
         
         # 插入新目录
-        db.directories.insert_one({
+        storage.insert_directories([{
             "username": username,
             "directory_id": request.id,
             "name": request.name,
             "is_default": request.isDefault,
             "created_at": datetime.fromtimestamp(request.createdAt / 1000)
-        })
+        }])
+        publish_event(username, "directory.created", id=request.id, origin=client_id)
         
         return DirectoryResponse(
             id=request.id,
@@ -141,9 +252,9 @@ async def create_directory(
 async def get_directories(username: str = Depends(verify_token)):
     """获取所有目录"""
     try:
-        db = get_database()
+        storage = get_storage()
         
-        directories_cursor = db.directories.find({"username": username})
+        directories_cursor = storage.iter_directories(username)
         directories = []
         for dir_doc in directories_cursor:
             directories.append(DirectoryResponse(
@@ -161,17 +272,15 @@ async def get_directories(username: str = Depends(verify_token)):
 async def update_directory(
     directory_id: str,
     request: UpdateDirectoryRequest,
-    username: str = Depends(verify_token)
+    username: str = Depends(verify_token),
+    client_id: Optional[str] = Depends(get_client_id)
 ):
     """更新目录"""
     try:
-        db = get_database()
+        storage = get_storage()
         
         # 查找目录
-        directory = db.directories.find_one({
-            "username": username,
-            "directory_id": directory_id
-        })
+        directory = storage.find_directory(username, directory_id)
         if not directory:
             raise HTTPException(status_code=404, detail="目录不存在")
         
@@ -186,16 +295,11 @@ async def update_directory(
             raise HTTPException(status_code=400, detail="没有提供要更新的字段")
         
         # 更新目录
-        db.directories.update_one(
-            {"username": username, "directory_id": directory_id},
-            {"$set": update_data}
-        )
+        storage.update_directory(username, directory_id, update_data)
         
         # 返回更新后的目录
-        updated = db.directories.find_one({
-            "username": username,
-            "directory_id": directory_id
-        })
+        updated = storage.find_directory(username, directory_id)
+        publish_event(username, "directory.updated", id=directory_id, origin=client_id)
         
         return DirectoryResponse(
             id=updated["directory_id"],
@@ -211,29 +315,25 @@ async def update_directory(
 @router.delete("/directories/{directory_id}", response_model=StandardResponse)
 async def delete_directory(
     directory_id: str,
-    username: str = Depends(verify_token)
+    username: str = Depends(verify_token),
+    client_id: Optional[str] = Depends(get_client_id)
 ):
     """删除目录及其关联的状态"""
     try:
-        db = get_database()
+        storage = get_storage()
         
         # 检查目录是否存在
-        directory = db.directories.find_one({
-            "username": username,
-            "directory_id": directory_id
-        })
+        directory = storage.find_directory(username, directory_id)
         if not directory:
             raise HTTPException(status_code=404, detail="目录不存在")
         
-        # 删除目录及其关联的状态
-        db.directories.delete_one({
-            "username": username,
-            "directory_id": directory_id
-        })
-        db.states.delete_many({
-            "username": username,
-            "directory_id": directory_id
-        })
+        # 删除目录及其关联的状态（含版本历史）
+        state_ids = storage.list_state_ids(username, directory_id)
+        storage.delete_directory(username, directory_id)
+        storage.delete_states(username, directory_id)
+        if state_ids:
+            storage.delete_revisions(username, state_ids)
+        publish_event(username, "directory.deleted", id=directory_id, states=state_ids, origin=client_id)
         
         return StandardResponse(
             success=True,
@@ -246,33 +346,34 @@ async def delete_directory(
 
 # ========== 状态管理 RESTful 接口 ==========
 
+def _check_state_capacity(storage, username: str, directory_id: str):
+    """与 /data/save 一致，每个目录最多 50 条状态"""
+    if len(storage.list_state_ids(username, directory_id)) >= 50:
+        raise HTTPException(status_code=400, detail=f"目录 {directory_id} 的状态数量不能超过 50 条")
+
 @router.post("/states", response_model=StateResponse, status_code=201)
 async def create_state(
     request: CreateStateRequest,
-    username: str = Depends(verify_token)
+    username: str = Depends(verify_token),
+    client_id: Optional[str] = Depends(get_client_id)
 ):
     """创建状态"""
     try:
-        db = get_database()
+        storage = get_storage()
         
         # 检查状态ID是否已存在
-        existing = db.states.find_one({
-            "username": username,
-            "state_id": request.id
-        })
+        existing = storage.find_state(username, request.id)
         if existing:
             raise HTTPException(status_code=400, detail="状态ID已存在")
         
         # 验证目录是否存在
-        directory = db.directories.find_one({
-            "username": username,
-            "directory_id": request.directoryId
-        })
+        directory = storage.find_directory(username, request.directoryId)
         if not directory:
             raise HTTPException(status_code=404, detail="目录不存在")
+        _check_state_capacity(storage, username, request.directoryId)
         
         # 插入新状态
-        db.states.insert_one({
+        state_doc = {
             "username": username,
             "directory_id": request.directoryId,
             "state_id": request.id,
@@ -281,7 +382,14 @@ async def create_state(
             "thumbnail": request.thumbnail,
             "state": request.state,
             "created_at": datetime.fromtimestamp(request.timestamp / 1000)
-        })
+        }
+        state_doc["revision"] = record_revision(storage, username, request.id, None, state_doc)
+        storage.insert_states([state_doc])
+        publish_event(
+            username, "state.created",
+            id=request.id, directoryId=request.directoryId, revision=state_doc["revision"],
+            origin=client_id
+        )
         
         return StateResponse(
             id=request.id,
@@ -303,14 +411,9 @@ async def get_states(
 ):
     """获取状态（支持按目录筛选）"""
     try:
-        db = get_database()
-        
-        # 构建查询条件
-        query = {"username": username}
-        if directory_id:
-            query["directory_id"] = directory_id
+        storage = get_storage()
         
-        states_cursor = db.states.find(query)
+        states_cursor = storage.iter_states(username, directory_id)
         states = []
         for state_doc in states_cursor:
             states.append(StateResponse(
@@ -330,28 +433,25 @@ async def get_states(
 async def update_state(
     state_id: str,
     request: UpdateStateRequest,
-    username: str = Depends(verify_token)
+    username: str = Depends(verify_token),
+    client_id: Optional[str] = Depends(get_client_id)
 ):
     """更新状态"""
     try:
-        db = get_database()
+        storage = get_storage()
         
         # 查找状态
-        state = db.states.find_one({
-            "username": username,
-            "state_id": state_id
-        })
+        state = storage.find_state(username, state_id)
         if not state:
             raise HTTPException(status_code=404, detail="状态不存在")
         
         # 如果更新目录ID，验证新目录是否存在
         if request.directoryId is not None:
-            directory = db.directories.find_one({
-                "username": username,
-                "directory_id": request.directoryId
-            })
+            directory = storage.find_directory(username, request.directoryId)
             if not directory:
                 raise HTTPException(status_code=404, detail="目标目录不存在")
+            if request.directoryId != state["directory_id"]:
+                _check_state_capacity(storage, username, request.directoryId)
         
         # 构建更新数据
         update_data = {}
@@ -370,17 +470,21 @@ async def update_state(
         if not update_data:
             raise HTTPException(status_code=400, detail="没有提供要更新的字段")
         
-        # 更新状态
-        db.states.update_one(
-            {"username": username, "state_id": state_id},
-            {"$set": update_data}
+        # 记录新版本
+        update_data["revision"] = record_revision(
+            storage, username, state_id, state, {**state, **update_data}
         )
         
+        # 更新状态
+        storage.update_state(username, state_id, update_data)
+        
         # 返回更新后的状态
-        updated = db.states.find_one({
-            "username": username,
-            "state_id": state_id
-        })
+        updated = storage.find_state(username, state_id)
+        publish_event(
+            username, "state.updated",
+            id=state_id, directoryId=updated["directory_id"], revision=updated.get("revision"),
+            origin=client_id
+        )
         
         return StateResponse(
             id=updated["state_id"],
@@ -398,25 +502,22 @@ async def update_state(
 @router.delete("/states/{state_id}", response_model=StandardResponse)
 async def delete_state(
     state_id: str,
-    username: str = Depends(verify_token)
+    username: str = Depends(verify_token),
+    client_id: Optional[str] = Depends(get_client_id)
 ):
     """删除状态"""
     try:
-        db = get_database()
+        storage = get_storage()
         
         # 检查状态是否存在
-        state = db.states.find_one({
-            "username": username,
-            "state_id": state_id
-        })
+        state = storage.find_state(username, state_id)
         if not state:
             raise HTTPException(status_code=404, detail="状态不存在")
         
-        # 删除状态
-        db.states.delete_one({
-            "username": username,
-            "state_id": state_id
-        })
+        # 删除状态及其版本历史
+        storage.delete_state(username, state_id)
+        storage.delete_revisions(username, [state_id])
+        publish_event(username, "state.deleted", id=state_id, directoryId=state["directory_id"], origin=client_id)
         
         return StandardResponse(
             success=True,
@@ -426,3 +527,112 @@ async def delete_state(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"删除状态失败: {str(e)}")
+
+# ========== 状态版本历史接口 ==========
+
+@router.get("/states/{state_id}/revisions", response_model=List[RevisionResponse])
+async def get_state_revisions(
+    state_id: str,
+    username: str = Depends(verify_token)
+):
+    """获取状态的版本列表（最新的在前）"""
+    try:
+        storage = get_storage()
+        
+        state = storage.find_state(username, state_id)
+        if not state:
+            raise HTTPException(status_code=404, detail="状态不存在")
+        
+        return [
+            RevisionResponse(
+                revision=rev_doc["rev"],
+                kind=rev_doc["kind"],
+                name=rev_doc["name"],
+                timestamp=rev_doc["timestamp"],
+                createdAt=int(rev_doc["created_at"].timestamp() * 1000)
+            )
+            for rev_doc in storage.list_revisions(username, state_id)
+        ]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取版本历史失败: {str(e)}")
+
+@router.get("/states/{state_id}/revisions/{revision}", response_model=StateRevisionResponse)
+async def get_state_revision(
+    state_id: str,
+    revision: int,
+    username: str = Depends(verify_token)
+):
+    """获取状态的指定版本"""
+    try:
+        storage = get_storage()
+        
+        content = load_revision(storage, username, state_id, revision)
+        if content is None:
+            raise HTTPException(status_code=404, detail="版本不存在")
+        
+        return StateRevisionResponse(
+            id=state_id,
+            directoryId=content["directory_id"],
+            timestamp=content["timestamp"],
+            name=content["name"],
+            state=content["state"],
+            revision=revision
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取版本失败: {str(e)}")
+
+@router.post("/states/{state_id}/revisions/{revision}/restore", response_model=StateRevisionResponse)
+async def restore_state_revision(
+    state_id: str,
+    revision: int,
+    username: str = Depends(verify_token),
+    client_id: Optional[str] = Depends(get_client_id)
+):
+    """将状态恢复到指定版本（恢复操作本身会产生一个新版本）"""
+    try:
+        storage = get_storage()
+        
+        state = storage.find_state(username, state_id)
+        if not state:
+            raise HTTPException(status_code=404, detail="状态不存在")
+        
+        content = load_revision(storage, username, state_id, revision)
+        if content is None:
+            raise HTTPException(status_code=404, detail="版本不存在")
+        
+        # 版本所属目录可能已被删除
+        directory = storage.find_directory(username, content["directory_id"])
+        if not directory:
+            raise HTTPException(status_code=404, detail="目标目录不存在")
+        
+        update_data = {
+            **content,
+            "created_at": datetime.fromtimestamp(content["timestamp"] / 1000)
+        }
+        update_data["revision"] = record_revision(
+            storage, username, state_id, state, {**state, **update_data}
+        )
+        storage.update_state(username, state_id, update_data)
+        publish_event(
+            username, "state.updated",
+            id=state_id, directoryId=content["directory_id"], revision=update_data["revision"],
+            origin=client_id
+        )
+        
+        return StateRevisionResponse(
+            id=state_id,
+            directoryId=content["directory_id"],
+            timestamp=content["timestamp"],
+            name=content["name"],
+            thumbnail=state.get("thumbnail"),
+            state=content["state"],
+            revision=update_data["revision"]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"恢复版本失败: {str(e)}")
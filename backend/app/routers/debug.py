@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from app.profiling import list_profiles, get_profile, verify_profile_token
+
+def require_profile_token(x_profile_token: Optional[str] = Header(None)):
+    """剖析接口只对持有 PROFILE_TOKEN 的管理员开放"""
+    verify_profile_token(x_profile_token)
+
+router = APIRouter(prefix="/debug", tags=["debug"], dependencies=[Depends(require_profile_token)])
+
+@router.get("/profiles")
+async def get_profiles():
+    """最近的剖析结果（不含调用统计）"""
+    return list_profiles()
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile_stats(profile_id: str):
+    """剖析结果的调用统计（按累计耗时排序）"""
+    profile = get_profile(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="剖析结果不存在")
+    return profile["stats"]
@@ -0,0 +1,42 @@
+from app.config import settings
+from app.storage.base import Storage
+
+storage: Storage = None
+
+def init_storage() -> Storage:
+    """根据配置初始化存储后端"""
+    global storage
+    backend = settings.STORAGE_BACKEND
+    if backend == "mongo":
+        from app.database import connect_to_mongo, get_database
+        connect_to_mongo()
+        if settings.MONGO_LAYOUT == "embedded":
+            from app.storage.mongo_embedded import MongoEmbeddedStorage, ensure_embedded_indexes
+            ensure_embedded_indexes(get_database())
+            storage = MongoEmbeddedStorage(get_database())
+        elif settings.MONGO_LAYOUT == "flat":
+            from app.storage.mongo import MongoStorage
+            storage = MongoStorage(get_database())
+        else:
+            raise ValueError(f"未知的 Mongo 文档布局: {settings.MONGO_LAYOUT}")
+    elif backend == "sqlite":
+        from app.storage.sqlite import SqliteStorage
+        storage = SqliteStorage(settings.SQLITE_PATH)
+        print(f"Using SQLite storage: {settings.SQLITE_PATH}")
+    else:
+        raise ValueError(f"未知的存储后端: {backend}")
+    return storage
+
+def close_storage():
+    global storage
+    if storage is None:
+        return
+    if storage.name.startswith("mongo"):
+        from app.database import close_mongo_connection
+        close_mongo_connection()
+    else:
+        storage.close()
+    storage = None
+
+def get_storage() -> Storage:
+    return storage
@@ -0,0 +1,165 @@
+from datetime import datetime
+from typing import Iterator, Optional
+
+
+class Storage:
+    """
+    存储后端接口
+    文档统一使用 Mongo 集合中的字段名（username、directory_id、state_id、created_at 等），
+    日期字段为 naive datetime，各实现负责与底层存储之间的转换
+    """
+
+    name = "base"
+
+    def close(self):
+        """释放连接等资源"""
+
+    # ========== 用户 ==========
+
+    def find_user(self, username: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def find_user_by_token(self, token: str) -> Optional[dict]:
+        """按旧版本写在用户文档上的 Token 查找用户"""
+        raise NotImplementedError
+
+    def insert_user(self, user_doc: dict):
+        raise NotImplementedError
+
+    def update_user(self, username: str, fields: dict):
+        raise NotImplementedError
+
+    def count_users(self) -> int:
+        raise NotImplementedError
+
+    def list_usernames(self) -> list:
+        raise NotImplementedError
+
+    def clear_user_token(self, username: str):
+        """移除用户文档上的旧版 Token"""
+        raise NotImplementedError
+
+    def find_inactive_users(self, cutoff: datetime, limit: int) -> list:
+        """最后活跃时间（没有时取最后登录时间）早于 cutoff 的用户名"""
+        raise NotImplementedError
+
+    def claim_inactive_user(self, username: str, cutoff: datetime, now: datetime, stale_before: datetime) -> bool:
+        """
+        原子地把用户标记为归档中（archiving_at = now）
+        仅当用户仍未活跃（判定同 find_inactive_users），且没有进行中的归档或标记早于 stale_before 时成功
+        """
+        raise NotImplementedError
+
+    def release_user_claim(self, username: str, claimed_at: datetime):
+        """撤销归档标记，只撤销仍为 claimed_at 的标记"""
+        raise NotImplementedError
+
+    def touch_user(self, username: str, fields: dict, stale_before: datetime) -> bool:
+        """
+        原子地更新未在归档中的用户，同时清除早于 stale_before 的遗留归档标记
+        返回: 是否更新成功（用户不存在或正在归档时为 False）
+        """
+        raise NotImplementedError
+
+    def delete_user(self, username: str):
+        raise NotImplementedError
+
+    # ========== 会话 ==========
+
+    def insert_session(self, session_doc: dict):
+        raise NotImplementedError
+
+    def find_session(self, token: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def update_session(self, token: str, fields: dict):
+        raise NotImplementedError
+
+    def delete_session(self, token: str):
+        raise NotImplementedError
+
+    def delete_sessions(self, username: str):
+        raise NotImplementedError
+
+    def trim_sessions(self, username: str, keep: int):
+        """只保留用户最近使用的 keep 个会话"""
+        raise NotImplementedError
+
+    def delete_expired_sessions(self, now: datetime) -> int:
+        raise NotImplementedError
+
+    # ========== 目录 ==========
+
+    def iter_directories(self, username: str) -> Iterator[dict]:
+        """按插入顺序遍历用户的目录"""
+        raise NotImplementedError
+
+    def find_directory(self, username: str, directory_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def insert_directories(self, directory_docs: list):
+        raise NotImplementedError
+
+    def update_directory(self, username: str, directory_id: str, fields: dict):
+        raise NotImplementedError
+
+    def delete_directory(self, username: str, directory_id: str):
+        """只删除目录本身，关联的状态由调用方通过 delete_states 删除"""
+        raise NotImplementedError
+
+    def delete_directories(self, username: str):
+        raise NotImplementedError
+
+    def reassign_owner(self, from_username: str, to_username: str):
+        """把 from_username 名下的目录和状态转到 to_username 名下"""
+        raise NotImplementedError
+
+    def list_owners(self, prefix: str) -> list:
+        """名下有目录或状态、且用户名以 prefix 开头的全部用户名"""
+        raise NotImplementedError
+
+    # ========== 状态 ==========
+
+    def iter_states(self, username: str, directory_id: Optional[str] = None) -> Iterator[dict]:
+        """按插入顺序遍历用户的状态，可按目录筛选"""
+        raise NotImplementedError
+
+    def find_state(self, username: str, state_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def list_state_ids(self, username: str, directory_id: str) -> list:
+        raise NotImplementedError
+
+    def insert_states(self, state_docs: list):
+        raise NotImplementedError
+
+    def update_state(self, username: str, state_id: str, fields: dict):
+        raise NotImplementedError
+
+    def delete_state(self, username: str, state_id: str):
+        raise NotImplementedError
+
+    def delete_states(self, username: str, directory_id: Optional[str] = None):
+        raise NotImplementedError
+
+    # ========== 状态版本 ==========
+
+    def save_revision(self, revision_doc: dict):
+        """写入版本，(username, state_id, rev) 已存在时覆盖"""
+        raise NotImplementedError
+
+    def list_revisions(self, username: str, state_id: str) -> list:
+        """版本元数据（不含内容），按版本号倒序"""
+        raise NotImplementedError
+
+    def find_snapshot_revision(self, username: str, state_id: str, max_rev: int) -> Optional[dict]:
+        """不晚于 max_rev 的最近一个完整快照"""
+        raise NotImplementedError
+
+    def iter_delta_revisions(self, username: str, state_id: str, after_rev: int, max_rev: int) -> Iterator[dict]:
+        """版本号在 (after_rev, max_rev] 之间的版本，按版本号升序"""
+        raise NotImplementedError
+
+    def delete_revisions(self, username: str, state_ids: Optional[list] = None, before_rev: Optional[int] = None):
+        """删除版本历史，state_ids 为 None 时删除该用户全部版本，before_rev 只删除更早的版本"""
+        raise NotImplementedError
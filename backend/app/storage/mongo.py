@@ -0,0 +1,228 @@
+import re
+from datetime import datetime
+from typing import Iterator, Optional
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.database import Database
+
+from app.storage.base import Storage
+
+
+def _inactive_query(cutoff: datetime) -> dict:
+    return {"$or": [
+        {"last_active": {"$lt": cutoff}},
+        {"last_active": {"$exists": False}, "last_login": {"$lt": cutoff}}
+    ]}
+
+
+def _unclaimed_query(stale_before: datetime) -> dict:
+    return {"$or": [
+        {"archiving_at": None},
+        {"archiving_at": {"$lt": stale_before}}
+    ]}
+
+
+class MongoStorage(Storage):
+    """基于 MongoDB 的存储后端"""
+
+    name = "mongo"
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    # ========== 用户 ==========
+
+    def find_user(self, username: str) -> Optional[dict]:
+        return self.db.users.find_one({"username": username})
+
+    def find_user_by_token(self, token: str) -> Optional[dict]:
+        return self.db.users.find_one({"token": token})
+
+    def insert_user(self, user_doc: dict):
+        self.db.users.insert_one(user_doc)
+
+    def update_user(self, username: str, fields: dict):
+        self.db.users.update_one({"username": username}, {"$set": fields})
+
+    def count_users(self) -> int:
+        return self.db.users.count_documents({})
+
+    def list_usernames(self) -> list:
+        return [u["username"] for u in self.db.users.find({}, {"username": 1})]
+
+    def clear_user_token(self, username: str):
+        self.db.users.update_one({"username": username}, {"$unset": {"token": ""}})
+
+    def find_inactive_users(self, cutoff: datetime, limit: int) -> list:
+        cursor = self.db.users.find(_inactive_query(cutoff), {"username": 1}).limit(limit)
+        return [u["username"] for u in cursor]
+
+    def claim_inactive_user(self, username: str, cutoff: datetime, now: datetime, stale_before: datetime) -> bool:
+        result = self.db.users.update_one(
+            {"username": username, "$and": [_inactive_query(cutoff), _unclaimed_query(stale_before)]},
+            {"$set": {"archiving_at": now}}
+        )
+        return result.matched_count == 1
+
+    def release_user_claim(self, username: str, claimed_at: datetime):
+        self.db.users.update_one(
+            {"username": username, "archiving_at": claimed_at},
+            {"$unset": {"archiving_at": ""}}
+        )
+
+    def touch_user(self, username: str, fields: dict, stale_before: datetime) -> bool:
+        result = self.db.users.update_one(
+            {"username": username, **_unclaimed_query(stale_before)},
+            {"$set": fields, "$unset": {"archiving_at": ""}}
+        )
+        return result.matched_count == 1
+
+    def delete_user(self, username: str):
+        self.db.users.delete_one({"username": username})
+
+    # ========== 会话 ==========
+
+    def insert_session(self, session_doc: dict):
+        self.db.sessions.insert_one(session_doc)
+
+    def find_session(self, token: str) -> Optional[dict]:
+        return self.db.sessions.find_one({"token": token})
+
+    def update_session(self, token: str, fields: dict):
+        self.db.sessions.update_one({"token": token}, {"$set": fields})
+
+    def delete_session(self, token: str):
+        self.db.sessions.delete_one({"token": token})
+
+    def delete_sessions(self, username: str):
+        self.db.sessions.delete_many({"username": username})
+
+    def trim_sessions(self, username: str, keep: int):
+        stale = self.db.sessions.find(
+            {"username": username}, {"_id": 1}
+        ).sort("last_used", DESCENDING).skip(keep)
+        stale_ids = [s["_id"] for s in stale]
+        if stale_ids:
+            self.db.sessions.delete_many({"_id": {"$in": stale_ids}})
+
+    def delete_expired_sessions(self, now: datetime) -> int:
+        # TTL 索引会在后台自动清理，这里负责及时回收
+        return self.db.sessions.delete_many({"expires_at": {"$lte": now}}).deleted_count
+
+    # ========== 目录 ==========
+
+    def iter_directories(self, username: str) -> Iterator[dict]:
+        return self.db.directories.find({"username": username})
+
+    def find_directory(self, username: str, directory_id: str) -> Optional[dict]:
+        return self.db.directories.find_one({
+            "username": username,
+            "directory_id": directory_id
+        })
+
+    def insert_directories(self, directory_docs: list):
+        self.db.directories.insert_many(directory_docs, ordered=False)
+
+    def update_directory(self, username: str, directory_id: str, fields: dict):
+        self.db.directories.update_one(
+            {"username": username, "directory_id": directory_id},
+            {"$set": fields}
+        )
+
+    def delete_directory(self, username: str, directory_id: str):
+        self.db.directories.delete_one({
+            "username": username,
+            "directory_id": directory_id
+        })
+
+    def delete_directories(self, username: str):
+        self.db.directories.delete_many({"username": username})
+
+    def reassign_owner(self, from_username: str, to_username: str):
+        self.db.directories.update_many({"username": from_username}, {"$set": {"username": to_username}})
+        self.db.states.update_many({"username": from_username}, {"$set": {"username": to_username}})
+
+    def list_owners(self, prefix: str) -> list:
+        query = {"username": {"$regex": f"^{re.escape(prefix)}"}}
+        owners = set(self.db.directories.distinct("username", query))
+        owners.update(self.db.states.distinct("username", query))
+        return sorted(owners)
+
+    # ========== 状态 ==========
+
+    def iter_states(self, username: str, directory_id: Optional[str] = None) -> Iterator[dict]:
+        query = {"username": username}
+        if directory_id:
+            query["directory_id"] = directory_id
+        return self.db.states.find(query).batch_size(50)
+
+    def find_state(self, username: str, state_id: str) -> Optional[dict]:
+        return self.db.states.find_one({
+            "username": username,
+            "state_id": state_id
+        })
+
+    def list_state_ids(self, username: str, directory_id: str) -> list:
+        return self.db.states.distinct("state_id", {
+            "username": username,
+            "directory_id": directory_id
+        })
+
+    def insert_states(self, state_docs: list):
+        self.db.states.insert_many(state_docs, ordered=False)
+
+    def update_state(self, username: str, state_id: str, fields: dict):
+        self.db.states.update_one(
+            {"username": username, "state_id": state_id},
+            {"$set": fields}
+        )
+
+    def delete_state(self, username: str, state_id: str):
+        self.db.states.delete_one({
+            "username": username,
+            "state_id": state_id
+        })
+
+    def delete_states(self, username: str, directory_id: Optional[str] = None):
+        query = {"username": username}
+        if directory_id is not None:
+            query["directory_id"] = directory_id
+        self.db.states.delete_many(query)
+
+    # ========== 状态版本 ==========
+
+    def save_revision(self, revision_doc: dict):
+        self.db.state_revisions.replace_one(
+            {
+                "username": revision_doc["username"],
+                "state_id": revision_doc["state_id"],
+                "rev": revision_doc["rev"]
+            },
+            revision_doc,
+            upsert=True
+        )
+
+    def list_revisions(self, username: str, state_id: str) -> list:
+        return list(self.db.state_revisions.find(
+            {"username": username, "state_id": state_id},
+            {"content": 0, "delta": 0}
+        ).sort("rev", DESCENDING))
+
+    def find_snapshot_revision(self, username: str, state_id: str, max_rev: int) -> Optional[dict]:
+        return self.db.state_revisions.find_one(
+            {"username": username, "state_id": state_id, "rev": {"$lte": max_rev}, "kind": "full"},
+            sort=[("rev", DESCENDING)]
+        )
+
+    def iter_delta_revisions(self, username: str, state_id: str, after_rev: int, max_rev: int) -> Iterator[dict]:
+        return self.db.state_revisions.find(
+            {"username": username, "state_id": state_id, "rev": {"$gt": after_rev, "$lte": max_rev}}
+        ).sort("rev", ASCENDING)
+
+    def delete_revisions(self, username: str, state_ids: Optional[list] = None, before_rev: Optional[int] = None):
+        query = {"username": username}
+        if state_ids is not None:
+            query["state_id"] = {"$in": state_ids}
+        if before_rev is not None:
+            query["rev"] = {"$lt": before_rev}
+        self.db.state_revisions.delete_many(query)
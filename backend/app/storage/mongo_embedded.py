@@ -0,0 +1,185 @@
+from typing import Iterator, Optional
+
+from pymongo import ASCENDING
+from pymongo.database import Database
+
+from app.storage.mongo import MongoStorage
+
+# 内嵌状态中不保存的字段（由所在目录文档提供）
+_PARENT_FIELDS = ("username", "directory_id")
+
+
+def ensure_embedded_indexes(db: Database):
+    db.directories.create_index([("username", ASCENDING), ("states.state_id", ASCENDING)])
+
+
+def _embed(state_doc: dict) -> dict:
+    return {k: v for k, v in state_doc.items() if k not in _PARENT_FIELDS and k != "_id"}
+
+
+def _unembed(username: str, directory_id: str, embedded: dict) -> dict:
+    return {"username": username, "directory_id": directory_id, **embedded}
+
+
+# 每个目录内嵌的状态数量上限，与接口层的校验一致，避免目录文档无限增长
+_MAX_STATES_PER_DIRECTORY = 50
+
+
+class MongoEmbeddedStorage(MongoStorage):
+    """
+    内嵌布局的 MongoDB 存储后端
+    每个目录文档以数组形式内嵌其状态（每个目录最多 50 条），
+    加载整个账户只需读取目录文档，单个状态的更新使用位置操作符 $ 完成
+    """
+
+    name = "mongo-embedded"
+
+    # ========== 目录 ==========
+
+    def iter_directories(self, username: str) -> Iterator[dict]:
+        return self.db.directories.find({"username": username}, {"states": 0})
+
+    def find_directory(self, username: str, directory_id: str) -> Optional[dict]:
+        return self.db.directories.find_one(
+            {"username": username, "directory_id": directory_id},
+            {"states": 0}
+        )
+
+    def insert_directories(self, directory_docs: list):
+        self.db.directories.insert_many(
+            [{"states": [], **doc} for doc in directory_docs],
+            ordered=False
+        )
+
+    # ========== 状态 ==========
+
+    def iter_states(self, username: str, directory_id: Optional[str] = None) -> Iterator[dict]:
+        # 状态按目录分组返回，目录内保持插入顺序
+        query = {"username": username}
+        if directory_id:
+            query["directory_id"] = directory_id
+        for dir_doc in self.db.directories.find(query, {"directory_id": 1, "states": 1}):
+            for embedded in dir_doc.get("states", []):
+                yield _unembed(username, dir_doc["directory_id"], embedded)
+
+    def find_state(self, username: str, state_id: str) -> Optional[dict]:
+        dir_doc = self.db.directories.find_one(
+            {"username": username, "states.state_id": state_id},
+            {"directory_id": 1, "states": {"$elemMatch": {"state_id": state_id}}}
+        )
+        if not dir_doc:
+            return None
+        return _unembed(username, dir_doc["directory_id"], dir_doc["states"][0])
+
+    def list_state_ids(self, username: str, directory_id: str) -> list:
+        dir_doc = self.db.directories.find_one(
+            {"username": username, "directory_id": directory_id},
+            {"states.state_id": 1}
+        )
+        if not dir_doc:
+            return []
+        return [s["state_id"] for s in dir_doc.get("states", [])]
+
+    def insert_states(self, state_docs: list):
+        by_directory = {}
+        for state_doc in state_docs:
+            by_directory.setdefault((state_doc["username"], state_doc["directory_id"]), []).append(_embed(state_doc))
+        for (username, directory_id), embedded in by_directory.items():
+            if len(embedded) > _MAX_STATES_PER_DIRECTORY:
+                raise ValueError(f"目录 {directory_id} 的状态数量不能超过 {_MAX_STATES_PER_DIRECTORY} 条")
+            # 只有写入后不超过上限时才匹配，并发写入也无法越过上限
+            result = self.db.directories.update_one(
+                {
+                    "username": username,
+                    "directory_id": directory_id,
+                    f"states.{_MAX_STATES_PER_DIRECTORY - len(embedded)}": {"$exists": False}
+                },
+                {"$push": {"states": {"$each": embedded}}}
+            )
+            if result.matched_count == 0:
+                # 内嵌布局下状态必须属于已存在的目录
+                if not self.find_directory(username, directory_id):
+                    raise ValueError(f"状态所属目录 {directory_id} 不存在")
+                raise ValueError(f"目录 {directory_id} 的状态数量不能超过 {_MAX_STATES_PER_DIRECTORY} 条")
+
+    def update_state(self, username: str, state_id: str, fields: dict):
+        fields = dict(fields)
+        fields.pop("username", None)
+        new_directory_id = fields.pop("directory_id", None)
+
+        if new_directory_id is not None:
+            current = self.find_state(username, state_id)
+            if current and current["directory_id"] != new_directory_id:
+                # 移动到其他目录：先写入新目录，再从原目录移除
+                moved = {**current, **fields, "directory_id": new_directory_id}
+                self.insert_states([moved])
+                self.db.directories.update_one(
+                    {"username": username, "directory_id": current["directory_id"]},
+                    {"$pull": {"states": {"state_id": state_id}}}
+                )
+                return
+
+        if fields:
+            self.db.directories.update_one(
+                {"username": username, "states.state_id": state_id},
+                {"$set": {f"states.$.{k}": v for k, v in fields.items()}}
+            )
+
+    def delete_state(self, username: str, state_id: str):
+        self.db.directories.update_one(
+            {"username": username, "states.state_id": state_id},
+            {"$pull": {"states": {"state_id": state_id}}}
+        )
+
+    def delete_states(self, username: str, directory_id: Optional[str] = None):
+        query = {"username": username}
+        if directory_id is not None:
+            query["directory_id"] = directory_id
+        self.db.directories.update_many(query, {"$set": {"states": []}})
+
+
+# ========== 布局迁移 ==========
+
+def migrate_to_embedded(db: Database) -> tuple[int, int]:
+    """
+    把 states 集合中的状态迁移为目录文档的内嵌数组
+    逐个目录处理，可重复执行：只追加尚未内嵌的状态，写入成功后才删除原文档；
+    没有所属目录的状态保留在 states 集合中
+    返回: (迁移的目录数量, 迁移的状态数量)
+    """
+    ensure_embedded_indexes(db)
+    directory_count = 0
+    state_count = 0
+    for dir_doc in db.directories.find({}, {"username": 1, "directory_id": 1, "states.state_id": 1}):
+        query = {"username": dir_doc["username"], "directory_id": dir_doc["directory_id"]}
+        flat_states = list(db.states.find(query))
+        # 上次迁移中断时部分状态可能已内嵌，跳过避免重复
+        embedded_ids = {s["state_id"] for s in dir_doc.get("states", [])}
+        embedded = [_embed(s) for s in flat_states if s["state_id"] not in embedded_ids]
+        db.directories.update_one({"_id": dir_doc["_id"]}, {"$push": {"states": {"$each": embedded}}})
+        if flat_states:
+            db.states.delete_many({"_id": {"$in": [s["_id"] for s in flat_states]}})
+        directory_count += 1
+        state_count += len(embedded)
+    return directory_count, state_count
+
+
+def migrate_to_flat(db: Database) -> tuple[int, int]:
+    """
+    把目录文档中的内嵌状态拆回 states 集合
+    逐个目录处理，可重复执行
+    返回: (迁移的目录数量, 迁移的状态数量)
+    """
+    directory_count = 0
+    state_count = 0
+    for dir_doc in db.directories.find({"states": {"$exists": True}}):
+        query = {"username": dir_doc["username"], "directory_id": dir_doc["directory_id"]}
+        # 上次迁移中断时可能已写入部分状态，先清理避免重复
+        db.states.delete_many(query)
+        states = [_unembed(dir_doc["username"], dir_doc["directory_id"], s) for s in dir_doc["states"]]
+        if states:
+            db.states.insert_many(states)
+        db.directories.update_one({"_id": dir_doc["_id"]}, {"$unset": {"states": ""}})
+        directory_count += 1
+        state_count += len(states)
+    return directory_count, state_count
@@ -0,0 +1,505 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Iterator, Optional
+
+from app.profiling import record_operation
+from app.storage.base import Storage
+
+# 每张表的列及其编码方式
+_TABLES = {
+    "users": {
+        "username": "text",
+        "token": "text",
+        "created_at": "datetime",
+        "last_login": "datetime",
+        "last_active": "datetime",
+        "archiving_at": "datetime",
+    },
+    "sessions": {
+        "token": "text",
+        "username": "text",
+        "created_at": "datetime",
+        "last_used": "datetime",
+        "expires_at": "datetime",
+    },
+    "directories": {
+        "username": "text",
+        "directory_id": "text",
+        "name": "text",
+        "is_default": "bool",
+        "created_at": "datetime",
+    },
+    "states": {
+        "username": "text",
+        "state_id": "text",
+        "directory_id": "text",
+        "name": "text",
+        "timestamp": "int",
+        "thumbnail": "text",
+        "state": "json",
+        "created_at": "datetime",
+        "revision": "int",
+    },
+    "state_revisions": {
+        "username": "text",
+        "state_id": "text",
+        "rev": "int",
+        "kind": "text",
+        "name": "text",
+        "timestamp": "int",
+        "created_at": "datetime",
+        "content": "json",
+        "delta": "json",
+    },
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT NOT NULL UNIQUE,
+    token TEXT UNIQUE,
+    created_at TEXT,
+    last_login TEXT,
+    last_active TEXT,
+    archiving_at TEXT
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    token TEXT NOT NULL PRIMARY KEY,
+    username TEXT NOT NULL,
+    created_at TEXT,
+    last_used TEXT,
+    expires_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (username, last_used);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+CREATE TABLE IF NOT EXISTS directories (
+    username TEXT NOT NULL,
+    directory_id TEXT NOT NULL,
+    name TEXT,
+    is_default INTEGER,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_directories_user_dir ON directories (username, directory_id);
+CREATE TABLE IF NOT EXISTS states (
+    username TEXT NOT NULL,
+    state_id TEXT NOT NULL,
+    directory_id TEXT NOT NULL,
+    name TEXT,
+    timestamp INTEGER,
+    thumbnail TEXT,
+    state TEXT,
+    created_at TEXT,
+    revision INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_states_user_state ON states (username, state_id);
+CREATE INDEX IF NOT EXISTS idx_states_user_dir ON states (username, directory_id);
+CREATE TABLE IF NOT EXISTS state_revisions (
+    username TEXT NOT NULL,
+    state_id TEXT NOT NULL,
+    rev INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT,
+    timestamp INTEGER,
+    created_at TEXT,
+    content TEXT,
+    delta TEXT,
+    PRIMARY KEY (username, state_id, rev)
+) WITHOUT ROWID;
+"""
+
+# 分页遍历时每页读取的行数，避免游标跨线程使用
+_PAGE_SIZE = 200
+
+
+class _TracedConnection(sqlite3.Connection):
+    """记录每条语句的耗时，供请求追踪使用"""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            record_operation(_statement_name(sql), (time.perf_counter() - start) * 1000)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            record_operation(_statement_name(sql), (time.perf_counter() - start) * 1000)
+
+
+def _statement_name(sql: str) -> str:
+    return " ".join(sql.split())[:120]
+
+
+def _encode(kind: str, value):
+    if value is None:
+        return None
+    if kind == "datetime":
+        return value.isoformat()
+    if kind == "json":
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    if kind == "bool":
+        return int(value)
+    return value
+
+
+def _decode(kind: str, value):
+    if value is None:
+        return None
+    if kind == "datetime":
+        return datetime.fromisoformat(value)
+    if kind == "json":
+        return json.loads(value)
+    if kind == "bool":
+        return bool(value)
+    return value
+
+
+class SqliteStorage(Storage):
+    """
+    基于 SQLite 的嵌入式存储后端（WAL 模式）
+    适合单机部署和测试，无需单独运行 mongod
+    每个线程使用独立连接，WAL 模式下读操作互不阻塞
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        # 内存数据库只能通过共享缓存在多个连接间共享
+        if path == ":memory:":
+            self.path = f"file:fretboard-{id(self)}?mode=memory&cache=shared"
+        self._keepalive = self._connect()
+        with self._keepalive:
+            self._keepalive.executescript(_SCHEMA)
+            self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        """为旧版本创建的数据库补齐新增的列"""
+        for table, codecs in _TABLES.items():
+            existing = {row[1] for row in self._keepalive.execute(f"PRAGMA table_info({table})")}
+            for col in codecs:
+                if col not in existing:
+                    col_type = "INTEGER" if codecs[col] in ("int", "bool") else "TEXT"
+                    self._keepalive.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=5.0,
+            uri=self.path.startswith("file:"),
+            isolation_level=None,
+            factory=_TracedConnection
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=OFF")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # 其他线程创建的连接，交给垃圾回收
+                pass
+
+    # ========== 通用辅助 ==========
+
+    def _row_to_doc(self, table: str, columns: list, row) -> dict:
+        codecs = _TABLES[table]
+        return {col: _decode(codecs[col], value) for col, value in zip(columns, row)}
+
+    def _where(self, table: str, query: dict) -> tuple[str, list]:
+        codecs = _TABLES[table]
+        clauses = []
+        params = []
+        for col, value in query.items():
+            if isinstance(value, (list, tuple)):
+                if not value:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{col} IN ({','.join('?' * len(value))})")
+                params.extend(_encode(codecs[col], v) for v in value)
+            else:
+                clauses.append(f"{col} = ?")
+                params.append(_encode(codecs[col], value))
+        return " AND ".join(clauses) or "1", params
+
+    def _find_one(self, table: str, query: dict, columns: Optional[list] = None) -> Optional[dict]:
+        columns = columns or list(_TABLES[table])
+        where, params = self._where(table, query)
+        row = self.conn.execute(
+            f"SELECT {','.join(columns)} FROM {table} WHERE {where} ORDER BY rowid LIMIT 1",
+            params
+        ).fetchone()
+        return self._row_to_doc(table, columns, row) if row else None
+
+    def _iter(self, table: str, query: dict) -> Iterator[dict]:
+        # 按 rowid 分页遍历，与 Mongo 的自然顺序（插入顺序）一致
+        columns = list(_TABLES[table])
+        where, params = self._where(table, query)
+        last_rowid = 0
+        while True:
+            rows = self.conn.execute(
+                f"SELECT rowid,{','.join(columns)} FROM {table} "
+                f"WHERE {where} AND rowid > ? ORDER BY rowid LIMIT {_PAGE_SIZE}",
+                params + [last_rowid]
+            ).fetchall()
+            for row in rows:
+                yield self._row_to_doc(table, columns, row[1:])
+            if len(rows) < _PAGE_SIZE:
+                return
+            last_rowid = rows[-1][0]
+
+    def _insert_many(self, table: str, docs: list):
+        if not docs:
+            return
+        codecs = _TABLES[table]
+        columns = list(codecs)
+        rows = [[_encode(codecs[col], doc.get(col)) for col in columns] for doc in docs]
+        conn = self.conn
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                f"INSERT INTO {table} ({','.join(columns)}) VALUES ({','.join('?' * len(columns))})",
+                rows
+            )
+
+    def _update(self, table: str, query: dict, fields: dict, limit_one: bool = False):
+        codecs = _TABLES[table]
+        assignments = ",".join(f"{col} = ?" for col in fields)
+        values = [_encode(codecs[col], value) for col, value in fields.items()]
+        where, params = self._where(table, query)
+        if limit_one:
+            where = f"rowid = (SELECT rowid FROM {table} WHERE {where} ORDER BY rowid LIMIT 1)"
+        self.conn.execute(f"UPDATE {table} SET {assignments} WHERE {where}", values + params)
+
+    def _delete(self, table: str, query: dict, limit_one: bool = False):
+        where, params = self._where(table, query)
+        if limit_one:
+            where = f"rowid = (SELECT rowid FROM {table} WHERE {where} ORDER BY rowid LIMIT 1)"
+        self.conn.execute(f"DELETE FROM {table} WHERE {where}", params)
+
+    # ========== 用户 ==========
+
+    def find_user(self, username: str) -> Optional[dict]:
+        return self._find_one("users", {"username": username})
+
+    def find_user_by_token(self, token: str) -> Optional[dict]:
+        return self._find_one("users", {"token": token})
+
+    def insert_user(self, user_doc: dict):
+        self._insert_many("users", [user_doc])
+
+    def update_user(self, username: str, fields: dict):
+        self._update("users", {"username": username}, fields)
+
+    def count_users(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def list_usernames(self) -> list:
+        return [row[0] for row in self.conn.execute("SELECT username FROM users ORDER BY rowid")]
+
+    def clear_user_token(self, username: str):
+        self._update("users", {"username": username}, {"token": None})
+
+    def find_inactive_users(self, cutoff: datetime, limit: int) -> list:
+        # 日期以 ISO 格式存储，可直接按字符串比较
+        return [row[0] for row in self.conn.execute(
+            "SELECT username FROM users WHERE COALESCE(last_active, last_login) < ? ORDER BY rowid LIMIT ?",
+            (_encode("datetime", cutoff), limit)
+        )]
+
+    def claim_inactive_user(self, username: str, cutoff: datetime, now: datetime, stale_before: datetime) -> bool:
+        cursor = self.conn.execute(
+            "UPDATE users SET archiving_at = ? WHERE username = ? AND COALESCE(last_active, last_login) < ? "
+            "AND (archiving_at IS NULL OR archiving_at < ?)",
+            (now.isoformat(), username, cutoff.isoformat(), stale_before.isoformat())
+        )
+        return cursor.rowcount == 1
+
+    def release_user_claim(self, username: str, claimed_at: datetime):
+        self.conn.execute(
+            "UPDATE users SET archiving_at = NULL WHERE username = ? AND archiving_at = ?",
+            (username, claimed_at.isoformat())
+        )
+
+    def touch_user(self, username: str, fields: dict, stale_before: datetime) -> bool:
+        codecs = _TABLES["users"]
+        assignments = "".join(f"{col} = ?," for col in fields)
+        values = [_encode(codecs[col], value) for col, value in fields.items()]
+        cursor = self.conn.execute(
+            f"UPDATE users SET {assignments} archiving_at = NULL "
+            "WHERE username = ? AND (archiving_at IS NULL OR archiving_at < ?)",
+            values + [username, stale_before.isoformat()]
+        )
+        return cursor.rowcount == 1
+
+    def delete_user(self, username: str):
+        self._delete("users", {"username": username})
+
+    # ========== 会话 ==========
+
+    def insert_session(self, session_doc: dict):
+        self._insert_many("sessions", [session_doc])
+
+    def find_session(self, token: str) -> Optional[dict]:
+        return self._find_one("sessions", {"token": token})
+
+    def update_session(self, token: str, fields: dict):
+        self._update("sessions", {"token": token}, fields)
+
+    def delete_session(self, token: str):
+        self._delete("sessions", {"token": token})
+
+    def delete_sessions(self, username: str):
+        self._delete("sessions", {"username": username})
+
+    def trim_sessions(self, username: str, keep: int):
+        self.conn.execute(
+            "DELETE FROM sessions WHERE username = ? AND token NOT IN "
+            "(SELECT token FROM sessions WHERE username = ? ORDER BY last_used DESC LIMIT ?)",
+            (username, username, keep)
+        )
+
+    def delete_expired_sessions(self, now: datetime) -> int:
+        return self.conn.execute(
+            "DELETE FROM sessions WHERE expires_at <= ?",
+            (_encode("datetime", now),)
+        ).rowcount
+
+    # ========== 目录 ==========
+
+    def iter_directories(self, username: str) -> Iterator[dict]:
+        return self._iter("directories", {"username": username})
+
+    def find_directory(self, username: str, directory_id: str) -> Optional[dict]:
+        return self._find_one("directories", {"username": username, "directory_id": directory_id})
+
+    def insert_directories(self, directory_docs: list):
+        self._insert_many("directories", directory_docs)
+
+    def update_directory(self, username: str, directory_id: str, fields: dict):
+        self._update("directories", {"username": username, "directory_id": directory_id}, fields, limit_one=True)
+
+    def delete_directory(self, username: str, directory_id: str):
+        self._delete("directories", {"username": username, "directory_id": directory_id}, limit_one=True)
+
+    def delete_directories(self, username: str):
+        self._delete("directories", {"username": username})
+
+    def reassign_owner(self, from_username: str, to_username: str):
+        conn = self.conn
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute("UPDATE directories SET username = ? WHERE username = ?", (to_username, from_username))
+            conn.execute("UPDATE states SET username = ? WHERE username = ?", (to_username, from_username))
+
+    def list_owners(self, prefix: str) -> list:
+        rows = self.conn.execute(
+            "SELECT username FROM directories WHERE substr(username, 1, ?) = ? "
+            "UNION SELECT username FROM states WHERE substr(username, 1, ?) = ? ORDER BY username",
+            (len(prefix), prefix, len(prefix), prefix)
+        )
+        return [row[0] for row in rows]
+
+    # ========== 状态 ==========
+
+    def iter_states(self, username: str, directory_id: Optional[str] = None) -> Iterator[dict]:
+        query = {"username": username}
+        if directory_id:
+            query["directory_id"] = directory_id
+        return self._iter("states", query)
+
+    def find_state(self, username: str, state_id: str) -> Optional[dict]:
+        return self._find_one("states", {"username": username, "state_id": state_id})
+
+    def list_state_ids(self, username: str, directory_id: str) -> list:
+        return [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT state_id FROM states WHERE username = ? AND directory_id = ?",
+            (username, directory_id)
+        )]
+
+    def insert_states(self, state_docs: list):
+        self._insert_many("states", state_docs)
+
+    def update_state(self, username: str, state_id: str, fields: dict):
+        self._update("states", {"username": username, "state_id": state_id}, fields, limit_one=True)
+
+    def delete_state(self, username: str, state_id: str):
+        self._delete("states", {"username": username, "state_id": state_id}, limit_one=True)
+
+    def delete_states(self, username: str, directory_id: Optional[str] = None):
+        query = {"username": username}
+        if directory_id is not None:
+            query["directory_id"] = directory_id
+        self._delete("states", query)
+
+    # ========== 状态版本 ==========
+
+    def save_revision(self, revision_doc: dict):
+        codecs = _TABLES["state_revisions"]
+        columns = list(codecs)
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO state_revisions ({','.join(columns)}) "
+            f"VALUES ({','.join('?' * len(columns))})",
+            [_encode(codecs[col], revision_doc.get(col)) for col in columns]
+        )
+
+    def list_revisions(self, username: str, state_id: str) -> list:
+        columns = ["username", "state_id", "rev", "kind", "name", "timestamp", "created_at"]
+        rows = self.conn.execute(
+            f"SELECT {','.join(columns)} FROM state_revisions "
+            "WHERE username = ? AND state_id = ? ORDER BY rev DESC",
+            (username, state_id)
+        ).fetchall()
+        return [self._row_to_doc("state_revisions", columns, row) for row in rows]
+
+    def find_snapshot_revision(self, username: str, state_id: str, max_rev: int) -> Optional[dict]:
+        columns = list(_TABLES["state_revisions"])
+        row = self.conn.execute(
+            f"SELECT {','.join(columns)} FROM state_revisions "
+            "WHERE username = ? AND state_id = ? AND rev <= ? AND kind = 'full' "
+            "ORDER BY rev DESC LIMIT 1",
+            (username, state_id, max_rev)
+        ).fetchone()
+        return self._row_to_doc("state_revisions", columns, row) if row else None
+
+    def iter_delta_revisions(self, username: str, state_id: str, after_rev: int, max_rev: int) -> Iterator[dict]:
+        columns = list(_TABLES["state_revisions"])
+        rows = self.conn.execute(
+            f"SELECT {','.join(columns)} FROM state_revisions "
+            "WHERE username = ? AND state_id = ? AND rev > ? AND rev <= ? ORDER BY rev",
+            (username, state_id, after_rev, max_rev)
+        ).fetchall()
+        return (self._row_to_doc("state_revisions", columns, row) for row in rows)
+
+    def delete_revisions(self, username: str, state_ids: Optional[list] = None, before_rev: Optional[int] = None):
+        query = {"username": username}
+        if state_ids is not None:
+            query["state_id"] = list(state_ids)
+        where, params = self._where("state_revisions", query)
+        if before_rev is not None:
+            where += " AND rev < ?"
+            params.append(before_rev)
+        self.conn.execute(f"DELETE FROM state_revisions WHERE {where}", params)
@@ -0,0 +1,62 @@
+import mongomock
+import pytest
+from fastapi.testclient import TestClient
+
+import app.storage as storage_module
+from app.database import ensure_indexes
+from app.main import app
+from app.storage.mongo import MongoStorage
+from app.storage.mongo_embedded import MongoEmbeddedStorage, ensure_embedded_indexes
+from app.storage.sqlite import SqliteStorage
+
+BACKENDS = ["sqlite", "mongo", "mongo-embedded"]
+
+
+def open_backend(name: str):
+    """打开一个空的存储后端，Mongo 使用 mongomock"""
+    if name == "sqlite":
+        return SqliteStorage(":memory:")
+    db = mongomock.MongoClient()["fretboard_test"]
+    ensure_indexes(db)
+    if name == "mongo-embedded":
+        ensure_embedded_indexes(db)
+        return MongoEmbeddedStorage(db)
+    return MongoStorage(db)
+
+
+@pytest.fixture
+def use_backend():
+    """切换当前使用的存储后端，返回后端实例"""
+    opened = []
+
+    def use(name: str):
+        backend = open_backend(name)
+        opened.append(backend)
+        storage_module.storage = backend
+        return backend
+
+    yield use
+    storage_module.storage = None
+    for backend in opened:
+        backend.close()
+
+
+@pytest.fixture(params=BACKENDS)
+def storage(request, use_backend):
+    return use_backend(request.param)
+
+
+@pytest.fixture
+def client():
+    # 不进入 lifespan，避免连接真实数据库和启动后台任务
+    return TestClient(app)
+
+
+@pytest.fixture
+def login(client):
+    """登录并返回认证头"""
+    def login(username: str) -> dict:
+        token = client.post("/api/auth/login", json={"username": username}).json()["token"]
+        return {"Authorization": f"Bearer {token}"}
+
+    return login
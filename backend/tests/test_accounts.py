@@ -0,0 +1,120 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import settings
+from app.maintenance import sweep
+
+PAYLOAD = {
+    "directories": [{"id": "d1", "name": "默认", "createdAt": 1700000000000, "isDefault": True}],
+    "states": [{"id": "s1", "directoryId": "d1", "timestamp": 1700000000000, "name": "状态", "state": {"a": 1}}]
+}
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ACCOUNT_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "INACTIVE_ACCOUNT_DAYS", 30)
+    return tmp_path
+
+
+def test_sessions_are_independent(client, login, storage):
+    first = login("alice")
+    second = login("alice")
+
+    assert client.post("/api/auth/logout", headers=first).status_code == 200
+    assert client.get("/api/auth/verify", headers=first).status_code == 401
+    assert client.get("/api/auth/verify", headers=second).status_code == 200
+
+
+def test_expired_session_is_rejected(client, login, storage):
+    headers = login("alice")
+    token = headers["Authorization"].split()[1]
+    storage.update_session(token, {"expires_at": datetime.utcnow() - timedelta(seconds=1)})
+
+    assert client.get("/api/auth/verify", headers=headers).status_code == 401
+
+
+def test_legacy_token_is_converted(client, storage):
+    now = datetime.utcnow()
+    storage.insert_user({"username": "alice", "token": "legacy", "created_at": now, "last_login": now})
+    headers = {"Authorization": "Bearer legacy"}
+
+    assert client.get("/api/auth/verify", headers=headers).json()["username"] == "alice"
+    assert storage.find_user_by_token("legacy") is None
+    assert client.get("/api/auth/verify", headers=headers).status_code == 200
+
+
+def test_inactive_account_is_archived_and_restored(client, login, storage, archive_dir):
+    client.post("/api/data/save", json=PAYLOAD, headers=login("alice"))
+    storage.update_user("alice", {"last_active": datetime.utcnow() - timedelta(days=31)})
+
+    assert sweep(storage)["archived_accounts"] == 1
+    assert storage.find_user("alice") is None
+    assert os.listdir(archive_dir) == ["alice-fretboard.ndjson.gz"]
+
+    response = client.post("/api/auth/login", json={"username": "alice"})
+    assert response.json()["message"] == "登录成功"
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    loaded = client.get("/api/data/load", headers=headers).json()
+    assert loaded["directories"] == PAYLOAD["directories"]
+    assert os.listdir(archive_dir) == []
+
+
+def test_failed_restore_fails_login_and_keeps_archive(client, login, storage, archive_dir):
+    client.post("/api/data/save", json=PAYLOAD, headers=login("alice"))
+    storage.update_user("alice", {"last_active": datetime.utcnow() - timedelta(days=31)})
+    sweep(storage)
+    path = archive_dir / "alice-fretboard.ndjson.gz"
+    good = path.read_bytes()
+    path.write_bytes(good[:-8])
+
+    response = client.post("/api/auth/login", json={"username": "alice"})
+    assert response.status_code == 503
+    assert storage.find_user("alice") is None
+    assert path.exists()
+
+    # 归档修复后再次登录即可恢复
+    path.write_bytes(good)
+    response = client.post("/api/auth/login", json={"username": "alice"})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    assert len(client.get("/api/data/load", headers=headers).json()["states"]) == 1
+
+
+def test_login_during_archive_does_not_lose_data(client, login, storage, archive_dir, monkeypatch):
+    client.post("/api/data/save", json=PAYLOAD, headers=login("alice"))
+    storage.update_user("alice", {"last_active": datetime.utcnow() - timedelta(days=31)})
+
+    # 归档文件已写出、数据尚未删除时登录
+    responses = []
+    delete_sessions = storage.delete_sessions
+
+    def login_then_delete(username):
+        responses.append(client.post("/api/auth/login", json={"username": username}))
+        delete_sessions(username)
+
+    monkeypatch.setattr(storage, "delete_sessions", login_then_delete)
+    assert sweep(storage)["archived_accounts"] == 1
+    assert responses[0].status_code == 503
+    assert os.listdir(archive_dir) == ["alice-fretboard.ndjson.gz"]
+
+    response = client.post("/api/auth/login", json={"username": "alice"})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    assert client.get("/api/data/load", headers=headers).json()["states"][0]["state"] == {"a": 1}
+    assert os.listdir(archive_dir) == []
+
+
+def test_failed_export_releases_claim(client, login, storage, archive_dir, monkeypatch):
+    client.post("/api/data/save", json=PAYLOAD, headers=login("alice"))
+    storage.update_user("alice", {"last_active": datetime.utcnow() - timedelta(days=31)})
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr("app.maintenance.export_file", fail)
+    assert sweep(storage)["archived_accounts"] == 0
+    assert os.listdir(archive_dir) == []
+    assert client.post("/api/auth/login", json={"username": "alice"}).status_code == 200
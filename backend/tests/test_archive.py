@@ -0,0 +1,86 @@
+import gzip
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.archive import ArchiveImporter, discard_stale_imports, iter_export
+
+
+def _archive(*records) -> bytes:
+    lines = [{"type": "meta", "version": 1}, *records]
+    return gzip.compress("".join(json.dumps(r) + "\n" for r in lines).encode("utf-8"))
+
+
+def _directory(directory_id):
+    return {"type": "directory", "id": directory_id, "name": directory_id, "createdAt": 1700000000000, "isDefault": False}
+
+
+def _state(state_id, directory_id, **fields):
+    return {
+        "type": "state", "id": state_id, "directoryId": directory_id,
+        "timestamp": 1700000000000, "name": state_id, "state": {"a": 1}, **fields
+    }
+
+
+def _import(storage, data: bytes, username="alice"):
+    importer = ArchiveImporter(storage, username, batch_size=1)
+    importer.feed(data)
+    return importer.close()
+
+
+def _directory_ids(storage, username="alice"):
+    return [d["directory_id"] for d in storage.iter_directories(username)]
+
+
+def test_round_trip(storage):
+    _import(storage, _archive(_directory("d1"), _state("s1", "d1"), _state("s2", "d1")))
+    exported = b"".join(iter_export(storage, "alice"))
+
+    assert _import(storage, exported, "bob") == (1, 2)
+    assert _directory_ids(storage, "bob") == ["d1"]
+    assert sorted(s["state_id"] for s in storage.iter_states("bob")) == ["s1", "s2"]
+
+
+@pytest.mark.parametrize("data", [
+    _archive(_directory("new"), _state("s1", "new"), _state("s1", "new")),
+    _archive(_directory("new"), _state("s1", "missing")),
+    _archive(_directory("new"), _state("s1", "new"))[:-8],
+])
+def test_invalid_archive_keeps_existing_data(storage, data):
+    _import(storage, _archive(_directory("old"), _state("s0", "old")))
+
+    with pytest.raises(HTTPException):
+        _import(storage, data)
+
+    assert _directory_ids(storage) == ["old"]
+    assert [s["state_id"] for s in storage.iter_states("alice")] == ["s0"]
+    assert storage.list_owners("~import:") == []
+
+
+def test_stale_imports_are_discarded(storage):
+    # 导入进程在 close 之前退出时遗留的临时数据
+    stale_owner = "~import:0:dead:alice"
+    storage.insert_directories([{
+        "username": stale_owner, "directory_id": "d1", "name": "d1",
+        "is_default": False, "created_at": None
+    }])
+    running = ArchiveImporter(storage, "bob", batch_size=1)
+    running.feed(_archive(_directory("d1"), _directory("d2")))
+
+    assert discard_stale_imports(storage) == 1
+    assert [owner.rsplit(":", 1)[1] for owner in storage.list_owners("~import:")] == ["bob"]
+    assert running.close() == (2, 0)
+
+
+def test_import_keeps_revision_history(storage):
+    _import(storage, _archive(_directory("d1"), _state("s1", "d1", state={"v": 1}), _state("s2", "d1")))
+    _import(storage, _archive(_directory("d1"), _state("s1", "d1", state={"v": 2})))
+
+    assert storage.find_state("alice", "s1")["revision"] == 2
+    assert [r["rev"] for r in storage.list_revisions("alice", "s1")] == [2, 1]
+    # 已不存在的状态不再保留历史
+    assert storage.list_revisions("alice", "s2") == []
+
+    from app.revisions import load_revision
+    assert load_revision(storage, "alice", "s1", 1)["state"] == {"v": 1}
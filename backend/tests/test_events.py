@@ -0,0 +1,52 @@
+import asyncio
+
+from app.auth import verify_event_token
+from app.events import EventHub, LocalBroker, get_event_client_id
+
+
+def _drain(subscription) -> list:
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait()["type"])
+    return events
+
+
+def test_events_skip_originating_client():
+    async def scenario():
+        hub = EventHub()
+        broker = LocalBroker()
+        broker.attach(hub)
+        tab_a = hub.subscribe("alice", "tab-a")
+        tab_b = hub.subscribe("alice", "tab-b")
+        anonymous = hub.subscribe("alice")
+        other_user = hub.subscribe("bob", "tab-a")
+
+        broker.publish("alice", {"type": "state.updated"}, origin="tab-a")
+        broker.publish("alice", {"type": "data.replaced"})
+        # 让 call_soon_threadsafe 投递的事件进入队列
+        await asyncio.sleep(0)
+
+        return [_drain(s) for s in (tab_a, tab_b, anonymous, other_user)]
+
+    tab_a, tab_b, anonymous, other_user = asyncio.run(scenario())
+    assert tab_a == ["data.replaced"]
+    assert tab_b == ["state.updated", "data.replaced"]
+    assert anonymous == ["state.updated", "data.replaced"]
+    assert other_user == []
+
+
+def test_event_stream_accepts_query_token(use_backend, login):
+    use_backend("sqlite")
+    token = login("event_user")["Authorization"].split()[1]
+
+    # 原生 EventSource 不能设置请求头，Token 和客户端标识通过查询参数传递
+    assert verify_event_token(authorization=None, token=token) == "event_user"
+    assert verify_event_token(authorization=f"Bearer {token}", token=None) == "event_user"
+    assert get_event_client_id(x_client_id=None, client_id="tab-a") == "tab-a"
+    assert get_event_client_id(x_client_id="tab-b", client_id="tab-a") == "tab-b"
+
+
+def test_event_stream_rejects_invalid_token(use_backend, client):
+    use_backend("sqlite")
+    assert client.get("/api/data/events?token=invalid").status_code == 401
+    assert client.get("/api/data/events").status_code == 401
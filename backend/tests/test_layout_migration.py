@@ -0,0 +1,50 @@
+import mongomock
+
+from app.storage.mongo_embedded import migrate_to_embedded, migrate_to_flat
+
+
+def _seed(db):
+    db.directories.insert_many([
+        {"username": "alice", "directory_id": "d1", "name": "D1"},
+        {"username": "alice", "directory_id": "d2", "name": "D2"},
+    ])
+    db.states.insert_many([
+        {"username": "alice", "directory_id": "d1", "state_id": f"s{i}", "name": f"S{i}"}
+        for i in range(3)
+    ])
+
+
+def _embedded_ids(db):
+    return {d["directory_id"]: [s["state_id"] for s in d["states"]] for d in db.directories.find()}
+
+
+def test_migrate_to_embedded_is_repeatable():
+    db = mongomock.MongoClient()["fretboard_test"]
+    _seed(db)
+
+    assert migrate_to_embedded(db) == (2, 3)
+    assert migrate_to_embedded(db) == (2, 0)
+    assert _embedded_ids(db) == {"d1": ["s0", "s1", "s2"], "d2": []}
+    assert db.states.count_documents({}) == 0
+
+
+def test_interrupted_migration_does_not_duplicate():
+    db = mongomock.MongoClient()["fretboard_test"]
+    _seed(db)
+    migrate_to_embedded(db)
+    # 模拟上次迁移在删除原文档前中断
+    db.states.insert_one({"username": "alice", "directory_id": "d1", "state_id": "s0", "name": "S0"})
+
+    assert migrate_to_embedded(db) == (2, 0)
+    assert _embedded_ids(db)["d1"] == ["s0", "s1", "s2"]
+    assert db.states.count_documents({}) == 0
+
+
+def test_round_trip():
+    db = mongomock.MongoClient()["fretboard_test"]
+    _seed(db)
+    migrate_to_embedded(db)
+
+    assert migrate_to_flat(db) == (2, 3)
+    assert sorted(s["state_id"] for s in db.states.find()) == ["s0", "s1", "s2"]
+    assert all("states" not in d for d in db.directories.find())
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+
+import app.profiling as profiling
+from app.config import settings
+
+
+@pytest.fixture
+def sample_everything(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_SAMPLE_RATE", 1.0)
+
+
+def _run(app, path: str) -> list:
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    asyncio.run(profiling.ProfilingMiddleware(app)(scope, receive, send))
+    return sent[0]["headers"]
+
+
+def _response_app(content_type: bytes):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        # 长连接输出期间不应持有剖析锁
+        if content_type == b"text/event-stream":
+            assert not profiling._profile_lock.locked()
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+def test_sampled_request_is_profiled(sample_everything):
+    headers = _run(_response_app(b"application/json"), "/api/data/load")
+    assert profiling.PROFILE_ID_HEADER.encode() in dict(headers)
+    assert not profiling._profile_lock.locked()
+
+
+@pytest.mark.parametrize("path", [f"{settings.API_PREFIX}/data/events", "/api/other-stream"])
+def test_event_stream_is_not_profiled(sample_everything, path):
+    headers = _run(_response_app(b"text/event-stream"), path)
+    assert profiling.PROFILE_ID_HEADER.encode() not in dict(headers)
+    assert not profiling._profile_lock.locked()
+
+
+def test_slow_request_is_logged(use_backend, client, login, monkeypatch, caplog):
+    use_backend("sqlite")
+    headers = login("slow_user")
+    monkeypatch.setattr(settings, "SLOW_REQUEST_MS", 0.001)
+
+    with caplog.at_level("WARNING", logger="app.slow"):
+        response = client.post("/api/data/save", json={"directories": [], "states": []}, headers=headers)
+    assert response.status_code == 200
+
+    records = [json.loads(r.getMessage()) for r in caplog.records if r.name == "app.slow"]
+    record = next(r for r in records if r["route"] == "/api/data/save")
+    assert record["event"] == "slow_request"
+    assert record["user"] == "slow_user"
+    assert record["payload_bytes"] > 0
+    assert record["db_ops"]
+
+
+def test_profile_token(use_backend, client, monkeypatch):
+    use_backend("sqlite")
+    monkeypatch.setattr(settings, "PROFILE_TOKEN", "secret")
+
+    response = client.post("/api/auth/login", json={"username": "profiled"}, headers={"X-Profile-Token": "secret"})
+    profile_id = response.headers[profiling.PROFILE_ID_HEADER]
+
+    stats = client.get(f"/api/debug/profiles/{profile_id}", headers={"X-Profile-Token": "secret"})
+    assert stats.status_code == 200
+    assert "cumulative" in stats.text
+
+    assert client.get(f"/api/debug/profiles/{profile_id}", headers={"X-Profile-Token": "wrong"}).status_code == 403
+    assert client.get("/api/debug/profiles").status_code == 403
@@ -0,0 +1,212 @@
+"""各存储后端对 Storage 接口的行为必须一致"""
+from datetime import datetime, timedelta
+
+import pytest
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def _directory(directory_id, username="alice", **fields):
+    return {
+        "username": username,
+        "directory_id": directory_id,
+        "name": f"目录 {directory_id}",
+        "is_default": False,
+        "created_at": T0,
+        **fields
+    }
+
+
+def _state(state_id, directory_id, username="alice", **fields):
+    return {
+        "username": username,
+        "state_id": state_id,
+        "directory_id": directory_id,
+        "name": f"状态 {state_id}",
+        "timestamp": 1700000000000,
+        "thumbnail": None,
+        "state": {"data": {"n1": {"color": "red"}}, "startFret": 0},
+        "created_at": T0,
+        "revision": 1,
+        **fields
+    }
+
+
+def _strip(doc):
+    return {k: v for k, v in doc.items() if k != "_id"}
+
+
+def test_users(storage):
+    storage.insert_user({"username": "alice", "created_at": T0, "last_login": T0})
+    storage.insert_user({"username": "bob", "token": "legacy", "created_at": T0, "last_login": T0})
+
+    assert storage.count_users() == 2
+    assert sorted(storage.list_usernames()) == ["alice", "bob"]
+    assert storage.find_user("alice")["created_at"] == T0
+    assert storage.find_user("nobody") is None
+    assert storage.find_user_by_token("legacy")["username"] == "bob"
+
+    storage.clear_user_token("bob")
+    assert storage.find_user_by_token("legacy") is None
+
+    storage.update_user("alice", {"last_active": T0 + timedelta(days=10)})
+    assert storage.find_inactive_users(T0 + timedelta(days=1), 10) == ["bob"]
+
+    storage.delete_user("bob")
+    assert storage.list_usernames() == ["alice"]
+
+
+def test_user_archive_claim(storage):
+    storage.insert_user({"username": "alice", "created_at": T0, "last_login": T0, "last_active": T0})
+    cutoff = T0 + timedelta(days=1)
+    claimed_at = T0 + timedelta(days=2)
+
+    assert storage.claim_inactive_user("alice", cutoff, claimed_at, claimed_at - timedelta(hours=1))
+    # 已被标记的账户不能再次标记，也不能被登录更新
+    assert not storage.claim_inactive_user("alice", cutoff, claimed_at, claimed_at - timedelta(hours=1))
+    assert not storage.touch_user("alice", {"last_login": claimed_at}, claimed_at - timedelta(hours=1))
+    assert storage.find_user("alice")["last_login"] == T0
+
+    storage.release_user_claim("alice", claimed_at)
+    assert storage.touch_user("alice", {"last_active": claimed_at}, claimed_at - timedelta(hours=1))
+    assert storage.find_user("alice")["last_active"] == claimed_at
+    # 重新活跃的账户不会被标记
+    assert not storage.claim_inactive_user("alice", cutoff, claimed_at, claimed_at - timedelta(hours=1))
+
+    # 遗留的过期标记可以被接管
+    storage.update_user("alice", {"last_active": T0})
+    assert storage.claim_inactive_user("alice", cutoff, T0 + timedelta(days=3), T0 + timedelta(days=3))
+    assert storage.claim_inactive_user("alice", cutoff, T0 + timedelta(days=4), T0 + timedelta(days=4))
+    assert storage.touch_user("alice", {"last_login": T0}, T0 + timedelta(days=5))
+    assert not storage.touch_user("nobody", {"last_login": T0}, T0)
+
+
+def test_sessions(storage):
+    # Mongo 的 TTL 索引会移除已过期的会话，过期时间需晚于当前时间
+    base = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+    for i in range(4):
+        storage.insert_session({
+            "token": f"t{i}",
+            "username": "alice",
+            "created_at": base,
+            "last_used": base + timedelta(minutes=i),
+            "expires_at": base + timedelta(days=i)
+        })
+
+    assert storage.find_session("t1")["username"] == "alice"
+    storage.update_session("t0", {"last_used": base + timedelta(hours=1)})
+    storage.trim_sessions("alice", 2)
+    assert [t for t in ("t0", "t1", "t2", "t3") if storage.find_session(t)] == ["t0", "t3"]
+
+    assert storage.delete_expired_sessions(base + timedelta(days=1)) == 1
+    assert storage.find_session("t0") is None
+
+    storage.delete_session("t3")
+    assert storage.find_session("t3") is None
+
+
+def test_directories_and_states(storage):
+    storage.insert_directories([_directory("d1", is_default=True), _directory("d2"), _directory("d1", username="bob")])
+    storage.insert_states([_state("s1", "d1"), _state("s2", "d1"), _state("s3", "d2"), _state("s1", "d1", username="bob")])
+
+    assert [d["directory_id"] for d in storage.iter_directories("alice")] == ["d1", "d2"]
+    assert storage.find_directory("alice", "d1")["is_default"] is True
+    assert storage.find_directory("alice", "missing") is None
+
+    assert _strip(storage.find_state("alice", "s1")) == _state("s1", "d1")
+    assert sorted(s["state_id"] for s in storage.iter_states("alice")) == ["s1", "s2", "s3"]
+    assert [s["state_id"] for s in storage.iter_states("alice", "d2")] == ["s3"]
+    assert sorted(storage.list_state_ids("alice", "d1")) == ["s1", "s2"]
+
+    storage.update_directory("alice", "d2", {"name": "改名"})
+    assert storage.find_directory("alice", "d2")["name"] == "改名"
+
+    # 修改内容并移动到其他目录
+    storage.update_state("alice", "s1", {"directory_id": "d2", "name": "移动", "revision": 2})
+    moved = storage.find_state("alice", "s1")
+    assert (moved["directory_id"], moved["name"], moved["revision"]) == ("d2", "移动", 2)
+    assert sorted(storage.list_state_ids("alice", "d2")) == ["s1", "s3"]
+
+    storage.delete_state("alice", "s3")
+    storage.delete_states("alice", "d1")
+    assert [s["state_id"] for s in storage.iter_states("alice")] == ["s1"]
+
+    storage.delete_directory("alice", "d1")
+    assert [d["directory_id"] for d in storage.iter_directories("alice")] == ["d2"]
+
+    # 其他用户的数据不受影响
+    assert [s["state_id"] for s in storage.iter_states("bob")] == ["s1"]
+    storage.delete_states("alice")
+    storage.delete_directories("alice")
+    assert list(storage.iter_directories("alice")) == []
+    assert [d["directory_id"] for d in storage.iter_directories("bob")] == ["d1"]
+
+
+def test_reassign_owner(storage):
+    storage.insert_directories([_directory("d1", username="staging")])
+    storage.insert_states([_state("s1", "d1", username="staging")])
+
+    storage.reassign_owner("staging", "alice")
+
+    assert list(storage.iter_directories("staging")) == []
+    assert [d["directory_id"] for d in storage.iter_directories("alice")] == ["d1"]
+    assert storage.find_state("alice", "s1")["directory_id"] == "d1"
+
+
+def test_revisions(storage):
+    def revision(rev, kind):
+        doc = {
+            "username": "alice", "state_id": "s1", "rev": rev, "kind": kind,
+            "name": f"v{rev}", "timestamp": rev, "created_at": T0
+        }
+        if kind == "full":
+            doc["content"] = {"name": f"v{rev}"}
+        else:
+            doc["delta"] = [{"op": "set", "path": ["name"], "value": f"v{rev}"}]
+        return doc
+
+    for rev in range(1, 6):
+        storage.save_revision(revision(rev, "full" if rev in (1, 4) else "delta"))
+    # 重复写入同一版本时覆盖
+    storage.save_revision(revision(5, "delta"))
+
+    listed = storage.list_revisions("alice", "s1")
+    assert [r["rev"] for r in listed] == [5, 4, 3, 2, 1]
+    assert all("content" not in r and "delta" not in r for r in listed)
+
+    assert storage.find_snapshot_revision("alice", "s1", 3)["rev"] == 1
+    assert storage.find_snapshot_revision("alice", "s1", 5)["content"] == {"name": "v4"}
+    assert [r["rev"] for r in storage.iter_delta_revisions("alice", "s1", 1, 3)] == [2, 3]
+
+    storage.delete_revisions("alice", ["s1"], before_rev=4)
+    assert [r["rev"] for r in storage.list_revisions("alice", "s1")] == [5, 4]
+    storage.delete_revisions("alice")
+    assert storage.list_revisions("alice", "s1") == []
+
+
+def test_list_owners(storage):
+    storage.insert_directories([
+        _directory("d1", username="~import:1:a:alice"),
+        _directory("d1", username="~import:2:b:bob"),
+        _directory("d1")
+    ])
+    storage.insert_states([_state("s1", "d1", username="~import:2:b:bob")])
+
+    assert storage.list_owners("~import:") == ["~import:1:a:alice", "~import:2:b:bob"]
+
+
+def test_embedded_state_limit(use_backend):
+    storage = use_backend("mongo-embedded")
+    storage.insert_directories([_directory("d1")])
+    storage.insert_states([_state(f"s{i}", "d1") for i in range(48)])
+
+    # 超出上限的批量写入整体不生效
+    with pytest.raises(ValueError):
+        storage.insert_states([_state(f"t{i}", "d1") for i in range(3)])
+    storage.insert_states([_state(f"t{i}", "d1") for i in range(2)])
+    with pytest.raises(ValueError):
+        storage.insert_states([_state("t2", "d1")])
+    assert len(storage.list_state_ids("alice", "d1")) == 50
+
+    with pytest.raises(ValueError, match="不存在"):
+        storage.insert_states([_state("x", "missing")])
@@ -21,7 +21,7 @@ import { Toast } from './components/Toast';
 import { FretboardSVG } from './components/FretboardSVG';
 import { LoginModal } from './components/LoginModal';
 import { saveFretboardState, restoreFretboardState, generateThumbnail, saveFretboardStateSilently, exportAllData } from './utils/fretboardHistory';
-import { saveData, loadData } from './utils/api';
+import { saveData, loadData, subscribeDataEvents } from './utils/api';
 import { storageService } from './services/storageService';
 
 function Fretboard() {
@@ -707,6 +707,32 @@ function Fretboard() {
     });
   }, [auth.isAuthenticated, auth.isLoading]);
 
+  // 实时同步：其他标签页或设备修改数据后重新加载（短时间内的多个事件合并为一次加载）
+  useEffect(() => {
+    if (auth.isLoading || !auth.isAuthenticated) return;
+
+    let reloadTimer = null;
+    const reload = () => {
+      storageService.loadAll().then(({ directories: loadedDirs, states: loadedStates }) => {
+        if (loadedDirs && loadedDirs.length > 0) {
+          setDirectories(loadedDirs);
+        }
+        setHistoryStates(loadedStates || []);
+      }).catch(error => {
+        console.error('同步数据失败:', error);
+      });
+    };
+    const unsubscribe = subscribeDataEvents(() => {
+      clearTimeout(reloadTimer);
+      reloadTimer = setTimeout(reload, 300);
+    });
+
+    return () => {
+      clearTimeout(reloadTimer);
+      unsubscribe();
+    };
+  }, [auth.isAuthenticated, auth.isLoading]);
+
   // 键盘事件 - 使用 ref 保持最新值，避免频繁重新注册导致重复触发
   const [showLoginModal, setShowLoginModal] = useState(false);
 
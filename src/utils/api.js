@@ -1,5 +1,7 @@
 const API_BASE_URL = '/api';
 const TIMEOUT = 10000; // 10秒超时
+// 每个标签页的客户端标识，服务端据此避免把本页发起的变更推送回本页
+const CLIENT_ID = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
 
 class ApiError extends Error {
     constructor(message, status) {
@@ -34,6 +36,7 @@ async function request(endpoint, options = {}) {
             ...options,
             headers: {
                 'Content-Type': 'application/json',
+                'X-Client-Id': CLIENT_ID,
                 ...getAuthHeaders(),
                 ...options.headers,
             },
@@ -118,10 +121,48 @@ export async function loadData() {
     return await request('/data/load');
 }
 
+// 实时推送的事件类型，收到任意一种都说明其他标签页或设备修改了数据
+const DATA_EVENT_TYPES = [
+    'directory.created', 'directory.updated', 'directory.deleted',
+    'state.created', 'state.updated', 'state.deleted',
+    'data.replaced', 'resync',
+];
+
+/**
+ * 订阅当前用户的数据变更（Server-Sent Events）
+ * 原生 EventSource 不能设置请求头，Token 和客户端标识通过查询参数传递；
+ * 本页发起的变更不会推送回本页。返回取消订阅的函数
+ */
+export function subscribeDataEvents(onEvent) {
+    const token = localStorage.getItem('auth-token');
+    if (!token || typeof EventSource === 'undefined') {
+        return () => {};
+    }
+
+    const params = new URLSearchParams({ token, clientId: CLIENT_ID });
+    const source = new EventSource(`${API_BASE_URL}/data/events?${params}`);
+    const handleEvent = (event) => {
+        let payload = {};
+        try {
+            payload = JSON.parse(event.data);
+        } catch {
+            // 忽略无法解析的事件内容，只按类型处理
+        }
+        onEvent({ ...payload, type: event.type });
+    };
+    DATA_EVENT_TYPES.forEach(type => source.addEventListener(type, handleEvent));
+
+    return () => source.close();
+}
+
 /**
  * 登出
  */
 export function logout() {
+    // 注销服务端会话，失败不影响本地登出
+    if (isLoggedIn()) {
+        request('/auth/logout', { method: 'POST' }).catch(() => {});
+    }
     localStorage.removeItem('auth-token');
     localStorage.removeItem('auth-username');
 }